@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+
+ROOT_PATH = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_PATH))
+
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+REPEATS = 3
+THRESHOLD = 0.25
+# increases this small are noise, whatever the ratio
+MIN_DELTA = {
+    'wall_time': 0.05,
+    'rss_growth': 16 * 2 ** 20,
+    'output_bytes': 0,
+}
+METRICS = ('wall_time', 'rss_growth', 'output_bytes')
+CHILD_ENV = {
+    'MPLBACKEND': 'Agg',
+    'PYTHONHASHSEED': '0',
+}
+
+
+def measure(script, name, repeats):
+    import matplotlib
+    import matplotlib.pyplot as plt
+    from sigmoid_media.datasets import open_dataset
+    from sigmoid_media.jobs import Job, forget_scripts, load_jobs
+    from sigmoid_media.scheduler import init_worker
+    from sigmoid_media.worker import warm_up
+
+    init_worker()
+    warm_up()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # the interpreter's own peak after imports and warm-up, so only what the job adds on top is counted
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        times = []
+        for _ in range(repeats):
+            plt.close('all')
+            matplotlib.rcdefaults()
+            # the script is imported again every time, so its lru_caches start as empty as in a fresh build
+            forget_scripts()
+            open_dataset.cache_clear()
+
+            start = time.perf_counter()
+            job = load_jobs(script)[name]
+            # same job, writing into a scratch directory so the committed assets are left alone
+            outputs = [Path(tmp) / path.resolve().relative_to(ROOT_PATH) for path in job.outputs]
+            job = Job(job.name, job.fn, outputs, job.inputs, job.deps, job.kwargs, job.formats)
+            job.run()
+            times.append(time.perf_counter() - start)
+
+        output_bytes = sum(path.stat().st_size for path in outputs)
+
+    return {
+        'wall_time': min(times),
+        'rss_growth': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024,
+        'output_bytes': output_bytes,
+    }
+
+
+def run_child(script, name, repeats):
+    # a fresh interpreter per job, so its memory peak is not inherited from an earlier job
+    result = subprocess.run(
+        [sys.executable, __file__, '--child', str(script), name, '--repeats', str(repeats)],
+        capture_output=True,
+        text=True,
+        env={**os.environ, **CHILD_ENV},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Benchmark {name} failed:\n{result.stderr}')
+
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def format_metric(metric, value):
+    if metric == 'wall_time':
+        return f'{value:.2f}s'
+    if metric == 'rss_growth':
+        return f'{value / 2 ** 20:.1f} MB'
+
+    return f'{value / 1024:.1f} KB'
+
+
+def compare(current, baseline, threshold):
+    regressions = []
+    for metric in METRICS:
+        if metric not in baseline:
+            continue
+        delta = current[metric] - baseline[metric]
+        if delta <= MIN_DELTA[metric]:
+            continue
+        # a job that used to add nothing regresses on any real increase
+        if not baseline[metric] or delta / baseline[metric] > threshold:
+            regressions.append(metric)
+
+    return regressions
+
+
+def report(name, current, baseline, regressions):
+    columns = []
+    for metric in METRICS:
+        column = format_metric(metric, current[metric])
+        if baseline and baseline.get(metric):
+            column += f' ({100 * (current[metric] / baseline[metric] - 1):+.0f}%)'
+        columns.append(column)
+
+    line = f'{name}: ' + ', '.join(columns)
+    if baseline is None:
+        line += ', no baseline'
+    elif regressions:
+        line += ', REGRESSION in ' + ', '.join(regressions)
+    print(line, flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every media job against the committed baseline.')
+    parser.add_argument('targets', nargs='*', help='job prefixes to benchmark, e.g. problems/sudoku')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='runs per job, the fastest one counts')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='relative increase flagged as a regression')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help='baseline file to compare against')
+    parser.add_argument('--update', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--child', nargs=2, metavar=('SCRIPT', 'JOB'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(*args.child, repeats=args.repeats)))
+        sys.exit()
+
+    from sigmoid_media.builder import collect_jobs
+    from sigmoid_media.jobs import script_name
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = {}
+    failed = False
+    for script, name in collect_jobs(args.targets):
+        key = f'{script_name(script)}/{name}'
+        results[key] = run_child(script, name, args.repeats)
+        regressions = compare(results[key], baseline.get(key, {}), args.threshold)
+        report(key, results[key], baseline.get(key), regressions)
+        failed = failed or bool(regressions)
+
+    if args.update:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=4, sort_keys=True) + '\n')
+    elif failed:
+        sys.exit(1)
@@ -0,0 +1,87 @@
+import os
+import time
+import argparse
+
+from sigmoid_media.worker import request
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build media assets for every problem.')
+    parser.add_argument('targets', nargs='*', help='job prefixes to build, e.g. problems/sudoku')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--list', action='store_true', help='list jobs without building them')
+    parser.add_argument(
+        '--svg',
+        action='store_true',
+        help='write figures as SVG instead of PNG, skipping jobs that only produce rasters, and report their sizes',
+    )
+    parser.add_argument(
+        '--optimize',
+        action='store_true',
+        help='losslessly shrink rendered PNGs, write WebP variants and record the savings',
+    )
+    parser.add_argument('--no-cache', action='store_true', help='render every job even if its outputs are cached')
+    parser.add_argument('--serve', action='store_true', help='run a warm render worker that later builds are sent to')
+    parser.add_argument('--warm', action='store_true', help='send this build to the running render worker')
+
+    return parser.parse_args()
+
+
+def send_warm(args):
+    start = time.perf_counter()
+    payload = {
+        'targets': args.targets,
+        'suffix': '.svg' if args.svg else None,
+        'use_cache': not args.no_cache,
+        'optimize': args.optimize,
+    }
+    try:
+        for line in request(payload):
+            print(line, flush=True)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print('No render worker running, building here instead', flush=True)
+        return False
+    except (RuntimeError, EOFError) as e:
+        # a worker that is stale, died mid-request or hit an error leaves the build to this process
+        print(f'Render worker failed, building here instead: {e}', flush=True)
+        return False
+    print(f'Done in {time.perf_counter() - start:.2f}s')
+
+    return True
+
+
+def main(args):
+    # imported only once a warm build has fallen through, since matplotlib and the rest dominate small builds
+    from sigmoid_media.builder import build, build_warm, collect_jobs
+    from sigmoid_media.jobs import script_name
+    from sigmoid_media.optimize import optimize_tree, report_savings, update_manifest
+    from sigmoid_media.svg import report_sizes
+    from sigmoid_media.worker import serve
+
+    suffix = '.svg' if args.svg else None
+    if args.serve:
+        serve(build_warm)
+        return
+
+    jobs = collect_jobs(args.targets, suffix=suffix)
+    if args.list:
+        for (script, name), job in jobs.items():
+            print(f'{script_name(script)}/{name}: {", ".join(str(path.name) for path in job.outputs)}')
+        return
+
+    start = time.perf_counter()
+    for line in build(jobs, args.jobs, suffix=suffix, use_cache=not args.no_cache, optimize=args.optimize):
+        print(line, flush=True)
+    print(f'Built {len(jobs)} jobs in {time.perf_counter() - start:.2f}s with {args.jobs} workers')
+
+    if args.svg:
+        report_sizes([path for job in jobs.values() for path in job.outputs])
+    if args.optimize:
+        records = optimize_tree(update_manifest({}), args.jobs)
+        report_savings(update_manifest(records))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if not (args.warm and not args.list and send_warm(args)):
+        main(args)
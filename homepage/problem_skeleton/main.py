@@ -1,15 +1,34 @@
-import os
+import sys
 from pathlib import Path
-import imageio.v2 as imageio
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from sigmoid_media.animation import build_palette, natural_key, write_animation
+from sigmoid_media.jobs import Job, run_jobs
 
 SCRIPT_PATH = Path(__file__).parent
+FRAME_PATHS = sorted(SCRIPT_PATH.glob('problem_skeleton*.png'), key=natural_key)
 
 
-if __name__ == '__main__':
-    imageio.mimsave(
-        SCRIPT_PATH / 'problem_skeleton.gif',
-        [imageio.imread(SCRIPT_PATH / filepath) for filepath in os.listdir(SCRIPT_PATH) if filepath.endswith('.png')],
-        format='GIF',
-        loop=0,
+def render_animation(path, frame_paths):
+    write_animation(
+        path,
+        frame_paths,
         duration=500,
+        loop=0,
+        palette=build_palette(frame_paths),
     )
+
+
+JOBS = [
+    Job(
+        name='problem_skeleton',
+        fn=render_animation,
+        outputs=[SCRIPT_PATH / 'problem_skeleton.gif'],
+        inputs=FRAME_PATHS,
+        kwargs={'frame_paths': FRAME_PATHS},
+    ),
+]
+
+
+if __name__ == '__main__':
+    run_jobs(JOBS)
@@ -1,25 +1,24 @@
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from sigmoid_media.jobs import Job, run_jobs
+from sigmoid_media.figures import FIGURE_FORMATS, FigureTemplate
+from sigmoid_media.sampling import adaptive_sample
+from sigmoid_media.themes import THEMES, TEXT_COLOR
+
 
 SCRIPT_PATH = Path(__file__).parent
-THEME = 'light'
 XLIM = (-5, 5)
 YLIM = (-0.5, 1.5)
 YTICKS = np.arange(YLIM[0], YLIM[1] + 0.5, 0.5)
-RESOLUTION = 1000
-COLOR = '#0A193B' if THEME == 'light' else '#9B67CC'
-LINEWIDTH = 3
-SNS_STYLE = {
-    'grid.color': '#AAB3C8' if THEME == 'light' else '#474072',
-    'axes.facecolor': '#DCDBEE' if THEME == 'light' else '#2C2847',
-    'figure.facecolor' :'none',
-    'xtick.color': '#000000' if THEME == 'light' else '#FFFFFF',
-    'ytick.color': '#000000' if THEME == 'light' else '#FFFFFF',
+COLOR = {
+    'light': '#0A193B',
+    'dark': '#9B67CC',
 }
-SPINE_COLOR = 'black' if THEME == 'light' else 'white'
+LINEWIDTH = 3
+SPINE_COLOR = TEXT_COLOR
 DPI = 100
 ALPHA = 0.8
 ZORDER = 100
@@ -45,66 +44,79 @@ def leaky_relu(x, alpha):
     return np.maximum(alpha * x, x)
 
 
-def plot_function(ax, x, f, **kwargs):
-    ax.plot(
-        x,
-        f,
-        color=kwargs.get('color', COLOR),
-        linewidth=kwargs.get('linewidth', LINEWIDTH),
-        alpha=kwargs.get('alpha', ALPHA),
-        zorder=ZORDER,
-    )
+class FunctionFigure(FigureTemplate):
+    def setup(self):
+        ax = self.ax
+        self.line, = ax.plot([], [], zorder=ZORDER)
 
-    ax.set_xlim(kwargs.get('xlim', XLIM))
-    ax.set_ylim(kwargs.get('ylim', YLIM))
-    ax.set_yticks(kwargs.get('yticks', YTICKS))
+        ax.spines['left'].set_position('zero')
+        ax.spines['bottom'].set_position('zero')
 
-    ax.spines['left'].set_position('zero')
-    ax.spines['bottom'].set_position('zero')
+        ax.spines['left'].set_color(SPINE_COLOR[self.theme])
+        ax.spines['bottom'].set_color(SPINE_COLOR[self.theme])
+        ax.spines['right'].set_color('none')
+        ax.spines['top'].set_color('none')
 
-    ax.spines['left'].set_color(SPINE_COLOR)
-    ax.spines['bottom'].set_color(SPINE_COLOR)
-    ax.spines['right'].set_color('none')
-    ax.spines['top'].set_color('none')
+        ax.xaxis.set_ticks_position('bottom')
+        ax.yaxis.set_ticks_position('left')
 
-    ax.xaxis.set_ticks_position('bottom')
-    ax.yaxis.set_ticks_position('left')
+    def update(self, x, y, **kwargs):
+        self.line.set_data(x, y)
+        self.line.set_color(kwargs.get('color', COLOR[self.theme]))
+        self.line.set_linewidth(kwargs.get('linewidth', LINEWIDTH))
+        self.line.set_alpha(kwargs.get('alpha', ALPHA))
 
+        self.ax.set_xlim(kwargs.get('xlim', XLIM))
+        self.ax.set_ylim(kwargs.get('ylim', YLIM))
+        self.ax.set_yticks(kwargs.get('yticks', YTICKS))
 
-if __name__ == '__main__':
-    sns.set_theme()
-    sns.set_style('darkgrid', SNS_STYLE)
 
-    config = {
-        'sigmoid': {
-            'fn': sigmoid,
-            'kwargs': {},
-        },
-        'step': {
-            'fn': step,
-            'kwargs': {},
-        },
-        'tanh': {
-            'fn': tanh,
-            'kwargs': {
-                'ylim': (-1.5, 1.5),
-                'yticks': (-1.5, -1, -0.5, 0, 0.5, 1, 1.5),
-            },
-        },
-        'relu': {
-            'fn': relu,
-            'kwargs': {},
-        },
-        'leaky_relu': {
-            'fn': lambda x: leaky_relu(x, 0.1),
-            'kwargs': {},
+def render_function(path, theme, fn, kwargs):
+    ylim = kwargs.get('ylim', YLIM)
+    x, y = adaptive_sample(fn, XLIM, y_span=ylim[1] - ylim[0])
+
+    with FunctionFigure(theme, DPI) as template:
+        template.render(path, x=x, y=y, **kwargs)
+
+
+config = {
+    'sigmoid': {
+        'fn': sigmoid,
+        'kwargs': {},
+    },
+    'step': {
+        'fn': step,
+        'kwargs': {},
+    },
+    'tanh': {
+        'fn': tanh,
+        'kwargs': {
+            'ylim': (-1.5, 1.5),
+            'yticks': (-1.5, -1, -0.5, 0, 0.5, 1, 1.5),
         },
-    }
+    },
+    'relu': {
+        'fn': relu,
+        'kwargs': {},
+    },
+    'leaky_relu': {
+        'fn': lambda x: leaky_relu(x, 0.1),
+        'kwargs': {},
+    },
+}
 
-    x = np.linspace(*XLIM, RESOLUTION)
+# one job per image, so each can be targeted and cached on its own
+JOBS = [
+    Job(
+        name=f'{name}_{theme}',
+        fn=render_function,
+        outputs=[SCRIPT_PATH / f'{name}_{theme}.png'],
+        kwargs={'theme': theme, 'fn': cfg['fn'], 'kwargs': cfg['kwargs']},
+        formats=FIGURE_FORMATS,
+    )
+    for theme in THEMES
+    for name, cfg in config.items()
+]
 
-    for name, cfg in config.items():
-        f = cfg['fn'](x)
-        fig, ax = plt.subplots()
-        plot_function(ax, x, f, **cfg['kwargs'])
-        plt.savefig(SCRIPT_PATH / f'{name}_{THEME}.png', dpi=DPI)
+if __name__ == '__main__':
+    run_jobs(JOBS)
@@ -1,10 +1,21 @@
-import os
+import sys
+import argparse
+import functools
 import numpy as np
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
+from matplotlib.figure import Figure
+from matplotlib.collections import PathCollection, PolyCollection
+from matplotlib.font_manager import FontProperties
+from matplotlib.textpath import TextPath
+from matplotlib.transforms import Affine2D
 from pathlib import Path
-import imgkit
-import base64
-import imageio.v2 as imageio
+from PIL import Image
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from sigmoid_media.animation import build_palette, write_animation
+from sigmoid_media.compositor import Heading, Panel, Stack, compose
+from sigmoid_media.figures import figure_to_array
+from sigmoid_media.jobs import Job, run_jobs
 
 
 SCRIPT_PATH = Path(__file__).parent
@@ -12,45 +23,8 @@ IMG_PATH = SCRIPT_PATH / 'img'
 KERNEL_PATH = SCRIPT_PATH / 'kernel'
 MULTIPLICATION_PATH = SCRIPT_PATH / 'multiplication'
 OUTPUT_PATH = SCRIPT_PATH / 'output'
-HTML_PATH = SCRIPT_PATH / 'html'
 FRAMES_PATH = SCRIPT_PATH / 'frames'
 
-HTML = '''
-<html lang="en">
-    <head>
-        <meta charset="utf-8" />
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <meta http-equiv="X-UA-Compatible" content="ie=edge">
-        <title>Convolution</title>
-        <link rel="stylesheet" href="style.css">
-    </head>
-    <body>
-        <div style="display: -webkit-box; display: flex; -webkit-box-orient: horizontal; -webkit-box-direction: normal; flex-direction: row; -webkit-box-pack: center; justify-content: center; -webkit-box-align: center; align-items: center; padding: 20px;">
-            <div style="display: -webkit-box; display: flex; -webkit-box-orient: vertical; -webkit-box-direction: normal; flex-direction: column; -webkit-box-pack: center; justify-content: center; -webkit-box-align: center; align-items: center; padding: 20px;">
-                <div style="display: -webkit-box; display: flex; -webkit-box-orient: horizontal; -webkit-box-direction: normal; flex-direction: row; -webkit-box-pack: center; justify-content: center; -webkit-box-align: center; align-items: center; padding: 20px;">
-                    <div style="display: -webkit-box; display: flex; -webkit-box-orient: vertical; -webkit-box-direction: normal; flex-direction: column; -webkit-box-pack: center; justify-content: center; -webkit-box-align: center; align-items: center; padding: 20px;">
-                        <h1 style="font-family: 'Franklin Gothic Medium', 'Arial Narrow', Arial, sans-serif;">Kernel</h1>
-                        <img src="data:image/png;base64,{b64kernel}" width="200px" />
-                    </div>
-                    <div style="display: -webkit-box; display: flex; -webkit-box-orient: vertical; -webkit-box-direction: normal; flex-direction: column; -webkit-box-pack: center; justify-content: center; -webkit-box-align: center; align-items: center; padding: 20px;">
-                        <h1 style="font-family: 'Franklin Gothic Medium', 'Arial Narrow', Arial, sans-serif;">Multiplication</h1>
-                        <img src="data:image/png;base64,{b64multiplication}" width="200px" />
-                    </div>
-                </div>
-                <div style="display: -webkit-box; display: flex; -webkit-box-orient: vertical; -webkit-box-direction: normal; flex-direction: column; -webkit-box-pack: center; justify-content: center; -webkit-box-align: center; align-items: center; padding: 20px;">
-                    <h1 style="font-family: 'Franklin Gothic Medium', 'Arial Narrow', Arial, sans-serif;">Image</h1>
-                    <img src="data:image/png;base64,{b64img}" width="400px" />
-                </div>
-            </div>
-            <div style="display: -webkit-box; display: flex; -webkit-box-orient: vertical; -webkit-box-direction: normal; flex-direction: column; -webkit-box-pack: center; justify-content: center; -webkit-box-align: center; align-items: center; padding: 20px;">
-                <h1 style="font-family: 'Franklin Gothic Medium', 'Arial Narrow', Arial, sans-serif;">Output</h1>
-                <img src="data:image/png;base64,{b64output}" width="250px" />
-            </div>
-        </div>
-    </body>
-</html>
-'''
-
 IMG = np.array(
     [
         [-2, -1, 5, 1],
@@ -67,6 +41,9 @@ KERNEL = np.array(
     ],
     dtype=int,
 )
+STRIDE = 1
+PADDING = 0
+DILATION = 1
 
 DARK_COLOR1 = '#0D001A'
 DARK_COLOR2 = '#0A193B'
@@ -79,6 +56,58 @@ FONT_SIZE_SMALL = 30
 FONT_SIZE_LARGE = 52
 FIGSIZE = (4, 4)
 DPI = 100
+FRAME_WIDTH = 1024
+CELL_PAD = 0.15
+CELL_PAD_RATIO = 0.15
+CELL_EDGE_COLOR = 'black'
+CELL_EDGE_WIDTH = 0.8
+CELL_TEXT_FILL = 0.9
+KERNEL_STYLE = {
+    'text_color': LIGHT_COLOR1,
+    'bg_color': DARK_COLOR4,
+    'highlight_text_color': None,
+    'highlight_bg_color': None,
+    'font_size': FONT_SIZE_LARGE,
+}
+IMG_STYLE = {
+    'text_color': DARK_COLOR1,
+    'bg_color': LIGHT_COLOR2,
+    'highlight_text_color': LIGHT_COLOR1,
+    'highlight_bg_color': DARK_COLOR2,
+    'font_size': FONT_SIZE_SMALL,
+}
+MULTIPLICATION_STYLE = {
+    'text_color': DARK_COLOR1,
+    'bg_color': LIGHT_COLOR3,
+    'highlight_text_color': None,
+    'highlight_bg_color': None,
+    'font_size': FONT_SIZE_LARGE,
+}
+OUTPUT_STYLE = {
+    'text_color': LIGHT_COLOR1,
+    'bg_color': DARK_COLOR3,
+    'highlight_text_color': None,
+    'highlight_bg_color': None,
+    'font_size': FONT_SIZE_LARGE,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def text_path(text, font_size):
+    prop = FontProperties(weight='bold')
+    path = TextPath((0, 0), text, size=font_size, prop=prop)
+    (x0, y0), (x1, y1) = path.get_extents().get_points()
+
+    # centre vertically on the line box like ax.text(va='center') does
+    (_, lp_y0), (_, lp_y1) = TextPath((0, 0), 'lp', size=font_size, prop=prop).get_extents().get_points()
+    y0, y1 = min(y0, lp_y0), max(y1, lp_y1)
+
+    return path.transformed(Affine2D().translate(-(x0 + x1) / 2, -(y0 + y1) / 2))
+
+
+@functools.lru_cache(maxsize=None)
+def text_width(text, font_size):
+    return text_path(text, font_size).get_extents().width
 
 
 def draw_grid(
@@ -96,128 +125,210 @@ def draw_grid(
     bg_colors = np.full(values.shape, fill_value=bg_color, dtype='U7')
     bg_colors[highlight_idx] = highlight_bg_color
 
-    for i in range(values.shape[0]):
-        for j in range(values.shape[1]):
-            value = values[i, j]
-            if value is None:
-                value = ''
-
-            ax[i, j].set_xticks([])
-            ax[i, j].set_yticks([])
-            ax[i, j].set_facecolor(bg_colors[i, j])
-            ax[i, j].text(
-                0.5,
-                0.5,
-                value,
-                color=text_colors[i, j],
-                fontsize=font_size,
-                weight='bold',
-                ha='center',
-                va='center',
-            )
+    # cells are one data unit wide, separated by a gap in inches that only shrinks for large grids
+    rows, cols = values.shape
+    width, height = ax.figure.get_size_inches() * ax.get_position().size
+    x_gap = min(CELL_PAD, CELL_PAD_RATIO * width / cols)
+    y_gap = min(CELL_PAD, CELL_PAD_RATIO * height / rows)
+    x_pad = x_gap * cols / (width - x_gap * (cols + 1))
+    y_pad = y_gap * rows / (height - y_gap * (rows + 1))
 
+    i, j = np.indices(values.shape).reshape(2, -1)
+    x = j * (1 + x_pad) + x_pad
+    y = i * (1 + y_pad) + y_pad
+    corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]])
+    cells = np.stack((x, y), axis=-1)[:, np.newaxis, :] + corners
 
-if __name__ == '__main__':
-    frame = 0
-    output = np.full(
-        (
-            IMG.shape[0] - KERNEL.shape[0] + 1,
-            IMG.shape[1] - KERNEL.shape[1] + 1,
-        ),
-        fill_value=None,
-        dtype=object,
+    ax.add_collection(
+        PolyCollection(
+            cells,
+            facecolors=bg_colors.ravel(),
+            edgecolors=CELL_EDGE_COLOR,
+            linewidths=CELL_EDGE_WIDTH,
+        )
     )
 
-    for i in range(IMG.shape[0] - KERNEL.shape[0] + 1):
-        for j in range(IMG.shape[1] - KERNEL.shape[1] + 1):
-            frame += 1
-            highlight_idx = np.s_[i:i + KERNEL.shape[0], j:j + KERNEL.shape[1]]
-            multiplication = IMG[highlight_idx] * KERNEL
-            output[i, j] = np.sum(multiplication)
-
-            fig, ax = plt.subplots(*IMG.shape, figsize=FIGSIZE, facecolor='none')
-            draw_grid(
-                ax=ax,
-                values=IMG,
-                text_color=DARK_COLOR1,
-                bg_color=LIGHT_COLOR2,
-                highlight_text_color=LIGHT_COLOR1,
-                highlight_bg_color=DARK_COLOR2,
-                font_size=FONT_SIZE_SMALL,
-                highlight_idx=highlight_idx,
-            )
-            plt.tight_layout()
-            plt.savefig(IMG_PATH / f'img_{frame}.png', dpi=DPI)
-            plt.close()
-
-            fig, ax = plt.subplots(*multiplication.shape, figsize=FIGSIZE, facecolor='none')
-            draw_grid(
-                ax=ax,
-                values=multiplication,
-                text_color=DARK_COLOR1,
-                bg_color=LIGHT_COLOR3,
-                highlight_text_color=None,
-                highlight_bg_color=None,
-                font_size=FONT_SIZE_LARGE,
-            )
-            plt.tight_layout()
-            plt.savefig(MULTIPLICATION_PATH / f'multiplication_{frame}.png', dpi=DPI)
-            plt.close()
-
-            fig, ax = plt.subplots(*output.shape, figsize=FIGSIZE, facecolor='none')
-            draw_grid(
-                ax=ax,
-                values=output,
-                text_color=LIGHT_COLOR1,
-                bg_color=DARK_COLOR3,
-                highlight_text_color=None,
-                highlight_bg_color=None,
-                font_size=FONT_SIZE_LARGE,
+    labels = ['' if value is None else str(value) for value in values.ravel()]
+    filled = [idx for idx, label in enumerate(labels) if label]
+
+    # shrink the font if the widest label would overflow its cell
+    cell_width = width / (cols * (1 + x_pad) + x_pad) * 72 * CELL_TEXT_FILL
+    widest = max((text_width(label, font_size) for label in {labels[idx] for idx in filled}), default=0)
+    if widest > cell_width:
+        font_size = font_size * cell_width / widest
+
+    if filled:
+        ax.add_collection(
+            PathCollection(
+                [text_path(labels[idx], font_size) for idx in filled],
+                offsets=np.stack((x[filled], y[filled]), axis=-1) + 0.5,
+                offset_transform=ax.transData,
+                transform=Affine2D().scale(ax.figure.dpi / 72),
+                facecolors=text_colors.ravel()[filled],
+                edgecolors='none',
             )
-            plt.tight_layout()
-            plt.savefig(OUTPUT_PATH / f'output_{frame}.png', dpi=DPI)
-            plt.close()
-
-    fig, ax = plt.subplots(*KERNEL.shape, figsize=FIGSIZE, facecolor='none')
-    draw_grid(
-        ax=ax,
-        values=KERNEL,
-        text_color=LIGHT_COLOR1,
-        bg_color=DARK_COLOR4,
-        highlight_text_color=None,
-        highlight_bg_color=None,
-        font_size=FONT_SIZE_LARGE,
+        )
+
+    ax.set_xlim(0, cols * (1 + x_pad) + x_pad)
+    ax.set_ylim(rows * (1 + y_pad) + y_pad, 0)
+    ax.set_axis_off()
+
+
+def padding_widths(size, kernel_size, stride, padding, dilation):
+    if padding == 'same':
+        span = (kernel_size - 1) * dilation + 1
+        total = max((-(-size // stride) - 1) * stride + span - size, 0)
+        return total // 2, total - total // 2
+
+    return padding, padding
+
+
+def convolution_plan(img, kernel, stride=1, padding=0, dilation=1):
+    padded = np.pad(
+        img,
+        [padding_widths(n, k, stride, padding, dilation) for n, k in zip(img.shape, kernel.shape)],
     )
-    plt.tight_layout()
-    plt.savefig(KERNEL_PATH / f'kernel.png', dpi=DPI)
-    plt.close()
+    span = tuple((np.array(kernel.shape) - 1) * dilation + 1)
 
-    with open(KERNEL_PATH / 'kernel.png', 'rb') as f:
-        b64kernel = base64.b64encode(f.read()).decode('utf-8')
+    # every window, product and output cell in one pass
+    windows = sliding_window_view(padded, span)[::stride, ::stride, ::dilation, ::dilation]
+    products = windows * kernel
+    output = products.sum(axis=(-2, -1))
 
-    for i in range(1, frame + 1):
-        with open(IMG_PATH / f'img_{i}.png', 'rb') as f:
-            b64img = base64.b64encode(f.read()).decode('utf-8')
+    order = np.arange(output.size).reshape(output.shape)
+    rows = np.arange(kernel.shape[0]) * dilation
+    cols = np.arange(kernel.shape[1]) * dilation
 
-        with open(MULTIPLICATION_PATH / f'multiplication_{i}.png', 'rb') as f:
-            b64multiplication = base64.b64encode(f.read()).decode('utf-8')
+    frames = []
+    for frame, (i, j) in enumerate(np.ndindex(output.shape)):
+        highlight_idx = np.ix_(i * stride + rows, j * stride + cols)
+        partial = np.where(order <= frame, output, None)
+        frames.append((highlight_idx, products[i, j], partial))
 
-        with open(OUTPUT_PATH / f'output_{i}.png', 'rb') as f:
-            b64output = base64.b64encode(f.read()).decode('utf-8')
+    return padded, frames
 
-        html_str = HTML.format(frame=i, b64kernel=b64kernel, b64img=b64img, b64multiplication=b64multiplication, b64output=b64output)
-        with open(HTML_PATH / f'index_{i}.html', 'w') as f:
-            f.write(html_str)
 
-        try:
-            imgkit.from_string(html_str, FRAMES_PATH / f'frame_{i}.png')
-        except:
-            pass
+def grid_image(values, **kwargs):
+    fig = Figure(figsize=FIGSIZE, dpi=DPI, facecolor='none')
+    ax = fig.add_axes([0, 0, 1, 1])
+    draw_grid(ax=ax, values=values, **kwargs)
 
-    imageio.mimsave(
-        SCRIPT_PATH / 'animation.gif',
-        [imageio.imread(FRAMES_PATH / frame_path) for frame_path in os.listdir(FRAMES_PATH)],
-        format='GIF',
-        loop=0,
+    return figure_to_array(fig)
+
+
+@functools.lru_cache(maxsize=None)
+def kernel_image():
+    return grid_image(KERNEL, **KERNEL_STYLE)
+
+
+def frame_panels(frame):
+    highlight_idx, multiplication, output = FRAMES[frame - 1]
+
+    return {
+        'img': grid_image(PADDED_IMG, highlight_idx=highlight_idx, **IMG_STYLE),
+        'multiplication': grid_image(multiplication, **MULTIPLICATION_STYLE),
+        'output': grid_image(output, **OUTPUT_STYLE),
+    }
+
+
+def frame_layout(kernel, multiplication, img, output):
+    return Stack(
+        Stack(
+            Stack(
+                Stack(Heading('Kernel'), Panel(kernel, width=200)),
+                Stack(Heading('Multiplication'), Panel(multiplication, width=200)),
+                direction='row',
+            ),
+            Stack(Heading('Image'), Panel(img, width=400)),
+        ),
+        Stack(Heading('Output'), Panel(output, width=250)),
+        direction='row',
+    )
+
+
+def render_kernel(path):
+    Image.fromarray(kernel_image()).save(path)
+
+
+def render_frame(frame_path, *intermediate_paths, frame):
+    panels = frame_panels(frame)
+    layout = frame_layout(kernel=kernel_image(), **panels)
+    compose(layout, width=FRAME_WIDTH).save(frame_path)
+
+    for path, panel in zip(intermediate_paths, panels.values()):
+        Image.fromarray(panel).save(path)
+
+
+def render_animation(path, frame_paths):
+    write_animation(
+        path,
+        frame_paths,
         duration=2000,
+        loop=0,
+        palette=build_palette(frame_paths),
+    )
+
+
+def convolution_jobs(write_intermediates=False):
+    jobs = []
+    if write_intermediates:
+        jobs.append(
+            Job(
+                name='kernel',
+                fn=render_kernel,
+                outputs=[KERNEL_PATH / 'kernel.png'],
+            )
+        )
+
+    for frame in range(1, len(FRAMES) + 1):
+        outputs = [FRAMES_PATH / f'frame_{frame}.png']
+        if write_intermediates:
+            outputs += [
+                IMG_PATH / f'img_{frame}.png',
+                MULTIPLICATION_PATH / f'multiplication_{frame}.png',
+                OUTPUT_PATH / f'output_{frame}.png',
+            ]
+
+        jobs.append(
+            Job(
+                name=f'frame_{frame}',
+                fn=render_frame,
+                outputs=outputs,
+                kwargs={'frame': frame},
+            )
+        )
+
+    jobs.append(
+        Job(
+            name='animation',
+            fn=render_animation,
+            outputs=[SCRIPT_PATH / 'animation.gif'],
+            deps=[f'frame_{frame}' for frame in range(1, len(FRAMES) + 1)],
+            kwargs={'frame_paths': [FRAMES_PATH / f'frame_{frame}.png' for frame in range(1, len(FRAMES) + 1)]},
+        )
+    )
+
+    return jobs
+
+
+PADDED_IMG, FRAMES = convolution_plan(IMG, KERNEL, stride=STRIDE, padding=PADDING, dilation=DILATION)
+JOBS = convolution_jobs()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--write-intermediates',
+        action='store_true',
+        help='also write the kernel, img, multiplication and output panels for debugging',
+    )
+    parser.add_argument(
+        '-j',
+        '--workers',
+        type=int,
+        default=1,
+        help='render frames across this many worker processes',
     )
+    args = parser.parse_args()
+
+    run_jobs(convolution_jobs(write_intermediates=args.write_intermediates), workers=args.workers)
@@ -1,15 +1,28 @@
+import sys
+import functools
 import numpy as np
-from sklearn.cluster import KMeans
-import pandas as pd
+from sklearn.cluster import KMeans, kmeans_plusplus
 import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from sigmoid_media.animation import AnimationWriter
+from sigmoid_media.datasets import load_csv
+from sigmoid_media.figures import FIGURE_FORMATS, FigureTemplate, save_figure
+from sigmoid_media.jobs import Job, run_jobs
+from sigmoid_media.scatter import RASTER_THRESHOLD, scatter
+from sigmoid_media.themes import BACKGROUND_COLOR, THEMES, TEXT_COLOR, set_style, themed_paths
+
 
 SCRIPT_PATH = Path(__file__).parent
-THEME = 'dark'
-NEUTRAL_COLOR = '#404040' if THEME == 'light' else '#A6A6A6'
-COLORS = ['#73009A', '#0A193B', '#FF4DA6'] if THEME == 'light' else ['#73009A', '#517CE1', '#FF4DA6']
+NEUTRAL_COLOR = {
+    'light': '#404040',
+    'dark': '#A6A6A6',
+}
+COLORS = {
+    'light': ['#73009A', '#0A193B', '#FF4DA6'],
+    'dark': ['#73009A', '#517CE1', '#FF4DA6'],
+}
 CENTROID_COLOR = '#FF5C33'
 CENTROID_EDGE_COLOR = '#4D0F00'
 ALPHA = 0.8
@@ -18,20 +31,78 @@ MARKER = 'o'
 CENTROID_MARKER = 'X'
 MARKER_SIZE = 80
 CENTROID_MARKER_SIZE = 130
-SNS_STYLE = {
-    'grid.color': '#AAB3C8' if THEME == 'light' else '#474072',
-    'axes.facecolor': '#DCDBEE' if THEME == 'light' else '#2C2847',
-    'figure.facecolor' :'none',
-    'xtick.color': '#000000' if THEME == 'light' else '#FFFFFF',
-    'ytick.color': '#000000' if THEME == 'light' else '#FFFFFF',
-}
-LABEL_TEXT_COLOR = 'black' if THEME == 'light' else 'white'
-LEGEND_TEXT_COLOR = 'black' if THEME == 'light' else 'white'
+LABEL_TEXT_COLOR = TEXT_COLOR
+LEGEND_TEXT_COLOR = TEXT_COLOR
 DPI = 100
+X_COL = 'SepalLengthCm'
+Y_COL = 'SepalWidthCm'
+LABEL_COL = 'Species'
+X_LABEL = 'Sepal Length (cm)'
+Y_LABEL = 'Sepal Width (cm)'
+N_CLUSTERS = 3
+RANDOM_STATE = 42
+LLOYD_MAX_ITER = 20
+LLOYD_BATCH_SIZE = 65536
+LLOYD_DURATION = 800
 
 
 def load_iris_data():
-    return pd.read_csv(SCRIPT_PATH / 'Iris.csv')
+    return load_csv(SCRIPT_PATH / 'Iris.csv')
+
+
+def load_points():
+    iris = load_iris_data()
+
+    return np.column_stack((iris[X_COL], iris[Y_COL]))
+
+
+@functools.lru_cache
+def fit_kmeans():
+    model = KMeans(n_clusters=N_CLUSTERS, random_state=RANDOM_STATE, n_init='auto')
+    model.fit(load_points())
+
+    return model
+
+
+def assign_clusters(points, centroids, batch_size=LLOYD_BATCH_SIZE):
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, one chunk of points at a time to bound memory
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(points), dtype=int)
+    for start in range(0, len(points), batch_size):
+        chunk = points[start:start + batch_size]
+        distances = centroid_norms - 2 * chunk @ centroids.T
+        labels[start:start + batch_size] = np.argmin(distances, axis=1)
+
+    return labels
+
+
+def update_centroids(points, labels, centroids):
+    counts = np.bincount(labels, minlength=len(centroids))
+    sums = np.column_stack([np.bincount(labels, weights=column, minlength=len(centroids)) for column in points.T])
+
+    # empty clusters keep their previous centroid
+    return np.where(counts[:, np.newaxis] > 0, sums / np.maximum(counts, 1)[:, np.newaxis], centroids)
+
+
+def lloyd_steps(points, n_clusters=N_CLUSTERS, max_iter=LLOYD_MAX_ITER, random_state=RANDOM_STATE):
+    centroids, _ = kmeans_plusplus(points, n_clusters, random_state=random_state)
+    labels = assign_clusters(points, centroids)
+    steps = [(0, 'assign', labels, centroids)]
+
+    for iteration in range(1, max_iter + 1):
+        new_centroids = update_centroids(points, labels, centroids)
+        if np.allclose(new_centroids, centroids):
+            break
+        centroids = new_centroids
+        steps.append((iteration, 'update', labels, centroids))
+
+        new_labels = assign_clusters(points, centroids)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        steps.append((iteration, 'assign', labels, centroids))
+
+    return steps
 
 
 def plot_kmeans(
@@ -43,36 +114,42 @@ def plot_kmeans(
     y_label,
     centroids=None,
     legend=True,
+    theme='light',
 ):
-    ax.set_xlabel(x_label, color=LABEL_TEXT_COLOR)
-    ax.set_ylabel(y_label, color=LABEL_TEXT_COLOR)
+    ax.set_xlabel(x_label, color=LABEL_TEXT_COLOR[theme])
+    ax.set_ylabel(y_label, color=LABEL_TEXT_COLOR[theme])
 
+    # past the threshold every group is binned into an image, centroids stay as markers
+    rasterize = len(x) > RASTER_THRESHOLD
+    artists = {'groups': []}
     for i, label in enumerate(np.unique(labels)):
         idx = labels == label
         kwargs = {}
-        colors = COLORS
+        colors = COLORS[theme]
         kwargs['label'] = f'Label {label}'
         if centroids is None:
             rng = np.random.default_rng(seed=42)
-            p = rng.permutation(len(COLORS))
-            colors = np.array(COLORS)[p]
+            p = rng.permutation(len(COLORS[theme]))
+            colors = np.array(COLORS[theme])[p]
             kwargs['label'] = label
 
         if not legend:
-            colors = [NEUTRAL_COLOR] * len(COLORS)
+            colors = [NEUTRAL_COLOR[theme]] * len(COLORS[theme])
 
-        ax.scatter(
-            x[idx],
-            y[idx],
-            c=colors[i],
+        artists['groups'].append(scatter(
+            ax,
+            np.asarray(x)[idx],
+            np.asarray(y)[idx],
+            rasterize=rasterize,
+            color=colors[i],
             marker=MARKER,
             s=MARKER_SIZE,
             alpha=ALPHA,
             **kwargs
-        )
+        ))
 
     if centroids is not None:
-        ax.scatter(
+        artists['centroids'] = ax.scatter(
             centroids[:, 0],
             centroids[:, 1],
             color=CENTROID_COLOR,
@@ -85,53 +162,104 @@ def plot_kmeans(
         )
 
     if legend:
-        ax.legend(labelcolor=LEGEND_TEXT_COLOR)
+        ax.legend(labelcolor=LEGEND_TEXT_COLOR[theme])
 
+    return artists
 
-if __name__ == '__main__':
-    sns.set_theme()
-    sns.set_style('darkgrid', SNS_STYLE)
 
+class KMeansFigure(FigureTemplate):
+    def __init__(self, theme, points, centroids):
+        self.points = points
+        self.centroids = centroids
+        super().__init__(theme, DPI)
+
+    def setup(self):
+        # one group per cluster, every point plotted once so the axes autoscale to the data
+        self.artists = plot_kmeans(
+            self.ax,
+            x=self.points[:, 0],
+            y=self.points[:, 1],
+            labels=np.arange(len(self.points)) % len(self.centroids),
+            x_label=X_LABEL,
+            y_label=Y_LABEL,
+            centroids=self.centroids,
+            theme=self.theme,
+        )
+        self.title = self.ax.set_title('', color=LABEL_TEXT_COLOR[self.theme])
+
+    def update(self, iteration, step, labels, centroids):
+        for label, group in enumerate(self.artists['groups']):
+            group.set_offsets(self.points[labels == label])
+        self.artists['centroids'].set_offsets(centroids)
+        self.title.set_text(f'Iteration {iteration}: {step}')
+
+
+def render_kmeans(*paths, mode):
     iris = load_iris_data()
-    x_col = 'SepalLengthCm'
-    y_col = 'SepalWidthCm'
-    label_col = 'Species'
-    x_label = 'Sepal Length (cm)'
-    y_label = 'Sepal Width (cm)'
-    model = KMeans(n_clusters=3, random_state=42, n_init='auto')
-    model.fit(iris[[x_col, y_col]])
-
-    fig, ax = plt.subplots(1)
-    plot_kmeans(
-        ax=ax,
-        x=iris[x_col],
-        y=iris[y_col],
-        labels=np.zeros(len(iris[x_col]), dtype=int),
-        x_label=x_label,
-        y_label=y_label,
-        legend=False,
-    )
-    plt.savefig(SCRIPT_PATH / f'raw_data_{THEME}.png', dpi=DPI)
-
-    fig, ax = plt.subplots(1)
-    plot_kmeans(
-        ax=ax,
-        x=iris[x_col],
-        y=iris[y_col],
-        labels=model.labels_,
-        x_label=x_label,
-        y_label=y_label,
-        centroids=model.cluster_centers_,
-    )
-    plt.savefig(SCRIPT_PATH / f'kmeans_predicted_labels_{THEME}.png', dpi=DPI)
-
-    fig, ax = plt.subplots(1)
-    plot_kmeans(
-        ax=ax,
-        x=iris[x_col],
-        y=iris[y_col],
-        labels=iris[label_col],
-        x_label=x_label,
-        y_label=y_label,
+    kwargs = {}
+    if mode == 'raw_data':
+        kwargs['labels'] = np.zeros(len(iris[X_COL]), dtype=int)
+        kwargs['legend'] = False
+    elif mode == 'kmeans_predicted_labels':
+        model = fit_kmeans()
+        kwargs['labels'] = model.labels_
+        kwargs['centroids'] = model.cluster_centers_
+    elif mode == 'actual_labels':
+        kwargs['labels'] = iris.decode(LABEL_COL)
+
+    for theme, path in zip(THEMES, paths):
+        set_style(theme)
+        fig, ax = plt.subplots(1)
+        plot_kmeans(
+            ax=ax,
+            x=iris[X_COL],
+            y=iris[Y_COL],
+            x_label=X_LABEL,
+            y_label=Y_LABEL,
+            theme=theme,
+            **kwargs
+        )
+        save_figure(fig, path, dpi=DPI)
+        plt.close(fig)
+
+
+def render_kmeans_iterations(*paths, duration):
+    points = load_points()
+    steps = lloyd_steps(points)
+
+    for theme, path in zip(THEMES, paths):
+        with KMeansFigure(theme, points, steps[0][3]) as template:
+            frames = [
+                {'iteration': iteration, 'step': step, 'labels': labels, 'centroids': centroids}
+                for iteration, step, labels, centroids in steps
+            ]
+            palette = template.sample_palette(frames, background=BACKGROUND_COLOR[theme])
+            with AnimationWriter(path, duration=duration, palette=palette, background=BACKGROUND_COLOR[theme]) as writer:
+                for frame in frames:
+                    template.update(**frame)
+                    writer.append(template.to_array())
+
+
+JOBS = [
+    Job(
+        name=mode,
+        fn=render_kmeans,
+        outputs=themed_paths(SCRIPT_PATH, mode),
+        inputs=[SCRIPT_PATH / 'Iris.csv'],
+        kwargs={'mode': mode},
+        formats=FIGURE_FORMATS,
     )
-    plt.savefig(SCRIPT_PATH / f'actual_labels_{THEME}.png', dpi=DPI)
+    for mode in ('raw_data', 'kmeans_predicted_labels', 'actual_labels')
+] + [
+    Job(
+        name='kmeans_iterations',
+        fn=render_kmeans_iterations,
+        outputs=themed_paths(SCRIPT_PATH, 'kmeans_iterations', suffix='.gif'),
+        inputs=[SCRIPT_PATH / 'Iris.csv'],
+        kwargs={'duration': LLOYD_DURATION},
+    ),
+]
+
+
+if __name__ == '__main__':
+    run_jobs(JOBS)
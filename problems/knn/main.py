@@ -1,23 +1,37 @@
+import sys
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
+from matplotlib.colors import ListedColormap
+from scipy.spatial import cKDTree
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from sigmoid_media.animation import AnimationWriter
+from sigmoid_media.datasets import load_csv
+from sigmoid_media.figures import FIGURE_FORMATS, FigureTemplate, save_figure
+from sigmoid_media.jobs import Job, run_jobs
+from sigmoid_media.scatter import RASTER_THRESHOLD, scatter
+from sigmoid_media.themes import BACKGROUND_COLOR, THEMES, TEXT_COLOR, set_style, themed_paths
+
 
 SCRIPT_PATH = Path(__file__).parent
-THEME = 'light'
 XLIM = (4, 8)
 YLIM = (1.75, 4.75)
 XSTEP = 0.5
 YSTEP = 0.25
 XTICKS = np.arange(XLIM[0], XLIM[1] + XSTEP, XSTEP)
 YTICKS = np.arange(YLIM[0], YLIM[1] + YSTEP, YSTEP)
-CLASS_1_COLOR = '#4800FF' if THEME == 'light' else '#B699FF'
+CLASS_1_COLOR = {
+    'light': '#4800FF',
+    'dark': '#B699FF',
+}
 CLASS_2_COLOR = '#BF333C'
 NEW_POINT_COLOR = '#00A058'
 ALPHA = 1
-NEIGHBOURS_COLOR = '#0A193B' if THEME == 'light' else '#A8BEF0'
+NEIGHBOURS_COLOR = {
+    'light': '#0A193B',
+    'dark': '#A8BEF0',
+}
 NEIGHBOURS_ALPHA = 0.5
 CLASS_1_MARKER = 'X'
 CLASS_2_MARKER = 'o'
@@ -25,21 +39,77 @@ NEW_POINT_MARKER = '^'
 MARKER_SIZE = 80
 NEIGHBOURS_RADIUS_SCALE = 1.1
 NEIGHBOURS_LINEWIDTH = 3
-SNS_STYLE = {
-    'grid.color': '#AAB3C8' if THEME == 'light' else '#474072',
-    'axes.facecolor': '#DCDBEE' if THEME == 'light' else '#2C2847',
-    'figure.facecolor' :'none',
-    'xtick.color': '#000000' if THEME == 'light' else '#FFFFFF',
-    'ytick.color': '#000000' if THEME == 'light' else '#FFFFFF',
-}
-LABEL_TEXT_COLOR = 'black' if THEME == 'light' else 'white'
-LEGEND_TEXT_COLOR = 'black' if THEME == 'light' else 'white'
+LABEL_TEXT_COLOR = TEXT_COLOR
+LEGEND_TEXT_COLOR = TEXT_COLOR
 DPI = 100
 SEED = 69
+CLASS_1_LABEL = 'Iris-setosa'
+CLASS_2_LABEL = 'Iris-virginica'
+X_COL = 'SepalLengthCm'
+Y_COL = 'SepalWidthCm'
+X_LABEL = 'Sepal Length (cm)'
+Y_LABEL = 'Sepal Width (cm)'
+NEW_POINT = np.array([5.5, 3.2], dtype=np.float64)
+DECISION_BOUNDARY_RESOLUTION = (1000, 1000)
+DECISION_BOUNDARY_ALPHA = 0.25
+DECISION_BOUNDARY_BATCH_SIZE = 65536
+K_SWEEP = range(1, 31)
+K_SWEEP_DURATION = 400
+PATH_SWEEP_K = 5
+PATH_SWEEP_FRAMES = 120
+PATH_SWEEP_CENTER = (6, 3.25)
+PATH_SWEEP_RADIUS = (1.5, 1)
+PATH_SWEEP_DURATION = 80
 
 
 def load_iris_data():
-    return pd.read_csv(SCRIPT_PATH / 'Iris.csv')
+    return load_csv(SCRIPT_PATH / 'Iris.csv')
+
+
+class NeighbourIndex:
+    def __init__(self, class_1, class_2):
+        self.points = np.vstack((class_1, class_2))
+        self.labels = np.repeat([0, 1], [len(class_1), len(class_2)])
+        self.tree = cKDTree(self.points)
+
+    def nearest(self, point, k):
+        # the tree returns neighbours closest first
+        _, idx = self.tree.query(point, k=min(k, len(self.points)))
+
+        return self.points[np.reshape(idx, -1)]
+
+    def classify(self, queries, k, batch_size=DECISION_BOUNDARY_BATCH_SIZE):
+        k = min(k, len(self.points))
+        predictions = np.empty(len(queries), dtype=np.intp)
+        for start in range(0, len(queries), batch_size):
+            _, idx = self.tree.query(queries[start:start + batch_size], k=k)
+            votes = self.labels[idx.reshape(len(idx), k)]
+            # an even k can split the vote, the nearest neighbour decides those
+            counts = 2 * votes.sum(axis=1)
+            predictions[start:start + batch_size] = np.where(counts == k, votes[:, 0], counts > k)
+
+        return predictions
+
+
+def decision_regions(index, k, resolution=DECISION_BOUNDARY_RESOLUTION):
+    xs = np.linspace(*XLIM, resolution[0])
+    ys = np.linspace(*YLIM, resolution[1])
+    mesh = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+    return index.classify(mesh, k).reshape(resolution[1], resolution[0])
+
+
+def neighbour_circle(neighbours):
+    center = np.mean(neighbours, axis=0)
+    radius = np.amax(np.linalg.norm(neighbours - center, axis=1)) * NEIGHBOURS_RADIUS_SCALE
+
+    return center, radius
+
+
+def sweep_path(frames, center=PATH_SWEEP_CENTER, radius=PATH_SWEEP_RADIUS):
+    t = np.linspace(0, 2 * np.pi, frames, endpoint=False)
+
+    return np.column_stack((center[0] + radius[0] * np.cos(t), center[1] + radius[1] * np.sin(t)))
 
 
 def plot_knn(
@@ -54,41 +124,64 @@ def plot_knn(
     new_point_label=None,
     k=None,
     show_neighbours=True,
+    theme='light',
+    index=None,
+    regions=None,
 ):
+    if index is None and show_neighbours:
+        index = NeighbourIndex(class_1, class_2)
+
     if show_neighbours:
-        all_classes = np.vstack((class_1, class_2))
-        distances = np.linalg.norm(all_classes - new_point, axis=1)
-        neighbours = all_classes[np.argsort(distances)[:k]]
-        neighbours_center = np.mean(neighbours, axis=0)
-        neighbours_radius = np.amax(np.linalg.norm(neighbours - neighbours_center, axis=1)) * NEIGHBOURS_RADIUS_SCALE
+        neighbours_center, neighbours_radius = neighbour_circle(index.nearest(new_point, k))
 
     ax.set_xlim(XLIM)
     ax.set_ylim(YLIM)
     ax.set_xticks(XTICKS)
     ax.set_yticks(YTICKS)
-    ax.set_xlabel(x_label, color=LABEL_TEXT_COLOR)
-    ax.set_ylabel(y_label, color=LABEL_TEXT_COLOR)
+    ax.set_xlabel(x_label, color=LABEL_TEXT_COLOR[theme])
+    ax.set_ylabel(y_label, color=LABEL_TEXT_COLOR[theme])
+
+    if regions is not None:
+        ax.imshow(
+            regions,
+            extent=(*XLIM, *YLIM),
+            origin='lower',
+            aspect='auto',
+            interpolation='nearest',
+            cmap=ListedColormap([CLASS_1_COLOR[theme], CLASS_2_COLOR]),
+            vmin=0,
+            vmax=1,
+            alpha=DECISION_BOUNDARY_ALPHA,
+            zorder=0,
+        )
 
-    ax.scatter(
+    # past the threshold both classes are binned into images, the query point and circle stay vector
+    rasterize = len(class_1) + len(class_2) > RASTER_THRESHOLD
+    scatter(
+        ax,
         class_1[:, 0],
         class_1[:, 1],
-        color=CLASS_1_COLOR,
+        rasterize=rasterize,
+        color=CLASS_1_COLOR[theme],
         marker=CLASS_1_MARKER,
         s=MARKER_SIZE,
         alpha=ALPHA,
         label=class_1_label,
     )
-    ax.scatter(
+    scatter(
+        ax,
         class_2[:, 0],
         class_2[:, 1],
+        rasterize=rasterize,
         color=CLASS_2_COLOR,
         marker=CLASS_2_MARKER,
         s=MARKER_SIZE,
         alpha=ALPHA,
         label=class_2_label,
     )
+    artists = {}
     if new_point is not None:
-        ax.scatter(
+        artists['new_point'] = ax.scatter(
             new_point[0],
             new_point[1],
             color=NEW_POINT_COLOR,
@@ -99,88 +192,174 @@ def plot_knn(
         )
 
     if show_neighbours:
-        ax.add_patch(
+        artists['neighbours'] = ax.add_patch(
             plt.Circle(
                 neighbours_center,
                 neighbours_radius,
                 alpha=NEIGHBOURS_ALPHA,
-                edgecolor=NEIGHBOURS_COLOR,
+                edgecolor=NEIGHBOURS_COLOR[theme],
                 facecolor='none',
                 linewidth=NEIGHBOURS_LINEWIDTH,
             )
         )
 
-    ax.legend(labelcolor=LEGEND_TEXT_COLOR)
+    ax.legend(labelcolor=LEGEND_TEXT_COLOR[theme])
 
+    return artists
 
-if __name__ == '__main__':
-    sns.set_theme()
-    sns.set_style('darkgrid', SNS_STYLE)
 
+class KnnFigure(FigureTemplate):
+    def __init__(self, theme, index, class_1, class_2):
+        self.index = index
+        self.class_1 = class_1
+        self.class_2 = class_2
+        super().__init__(theme, DPI)
+
+    def setup(self):
+        self.artists = plot_knn(
+            self.ax,
+            class_1=self.class_1,
+            class_1_label=CLASS_1_LABEL,
+            class_2=self.class_2,
+            class_2_label=CLASS_2_LABEL,
+            x_label=X_LABEL,
+            y_label=Y_LABEL,
+            new_point=NEW_POINT,
+            new_point_label='New Point',
+            k=1,
+            show_neighbours=True,
+            theme=self.theme,
+            index=self.index,
+        )
+        self.title = self.ax.set_title('', color=LABEL_TEXT_COLOR[self.theme])
+        # spines and legend are redrawn too, so they stay above the circle and the legend's best location follows the point
+        self.animate(
+            self.artists['new_point'],
+            self.artists['neighbours'],
+            self.title,
+            self.ax.get_legend(),
+            *self.ax.spines.values(),
+        )
+
+    def update(self, new_point, k):
+        center, radius = neighbour_circle(self.index.nearest(new_point, k))
+        self.artists['new_point'].set_offsets([new_point])
+        self.artists['neighbours'].set_center(center)
+        self.artists['neighbours'].set_radius(radius)
+        self.title.set_text(f'k = {k}')
+
+
+def load_classes(n_samples=None):
     iris = load_iris_data()
-    class_1_label = 'Iris-setosa'
-    class_2_label = 'Iris-virginica'
-    setosa = iris.loc[iris['Species'] == class_1_label]
-    virginica = iris.loc[iris['Species'] == class_2_label]
-    x_col = 'SepalLengthCm'
-    y_col = 'SepalWidthCm'
-
-    setosa_samples = setosa.sample(n=2, random_state=SEED)
-    virginica_samples = virginica.sample(n=2, random_state=SEED)
-
-    class_1 = setosa_samples[[x_col, y_col]].to_numpy(dtype=np.float64)
-    class_2 = virginica_samples[[x_col, y_col]].to_numpy(dtype=np.float64)
-    new_point = np.array([5.5, 3.2], dtype=np.float64)
-    x_label = 'Sepal Length (cm)'
-    y_label = 'Sepal Width (cm)'
-
-    fig, ax = plt.subplots(1)
-    plot_knn(
-        ax,
-        class_1=class_1,
-        class_1_label=class_1_label,
-        class_2=class_2,
-        class_2_label=class_2_label,
-        x_label=x_label,
-        y_label=y_label,
-        new_point=new_point,
-        new_point_label='New Point',
-        k=3,
-        show_neighbours=False,
-    )
-    plt.savefig(SCRIPT_PATH / f'knn_{THEME}.png', dpi=DPI)
+    points = np.column_stack((iris[X_COL], iris[Y_COL]))
+    class_1 = points[iris.mask('Species', CLASS_1_LABEL)]
+    class_2 = points[iris.mask('Species', CLASS_2_LABEL)]
 
-    fig, ax = plt.subplots(1)
-    plot_knn(
-        ax,
-        class_1=class_1,
-        class_1_label=class_1_label,
-        class_2=class_2,
-        class_2_label=class_2_label,
-        x_label=x_label,
-        y_label=y_label,
-        new_point=new_point,
-        new_point_label='New Point',
-        k=3,
-        show_neighbours=True,
-    )
-    plt.savefig(SCRIPT_PATH / f'knn_neighbours_{THEME}.png', dpi=DPI)
+    if n_samples is not None:
+        # the same draw DataFrame.sample(n, random_state=SEED) makes
+        class_1 = class_1[np.random.RandomState(SEED).choice(len(class_1), size=n_samples, replace=False)]
+        class_2 = class_2[np.random.RandomState(SEED).choice(len(class_2), size=n_samples, replace=False)]
 
-    class_1 = setosa[[x_col, y_col]].to_numpy(dtype=np.float64)
-    class_2 = virginica[[x_col, y_col]].to_numpy(dtype=np.float64)
+    return class_1, class_2
 
-    fig, ax = plt.subplots(1)
-    plot_knn(
-        ax,
-        class_1=class_1,
-        class_1_label=class_1_label,
-        class_2=class_2,
-        class_2_label=class_2_label,
-        x_label=x_label,
-        y_label=y_label,
-        new_point=new_point,
-        new_point_label='New Point',
-        k=8,
-        show_neighbours=False,
-    )
-    plt.savefig(SCRIPT_PATH / f'knn_all_{THEME}.png', dpi=DPI)
+
+def render_knn(*paths, n_samples, k, show_neighbours, show_decision_boundary=False):
+    class_1, class_2 = load_classes(n_samples)
+    index = NeighbourIndex(class_1, class_2)
+    regions = decision_regions(index, k) if show_decision_boundary else None
+
+    for theme, path in zip(THEMES, paths):
+        set_style(theme)
+        fig, ax = plt.subplots(1)
+        plot_knn(
+            ax,
+            class_1=class_1,
+            class_1_label=CLASS_1_LABEL,
+            class_2=class_2,
+            class_2_label=CLASS_2_LABEL,
+            x_label=X_LABEL,
+            y_label=Y_LABEL,
+            new_point=NEW_POINT,
+            new_point_label='New Point',
+            k=k,
+            show_neighbours=show_neighbours,
+            theme=theme,
+            index=index,
+            regions=regions,
+        )
+        save_figure(fig, path, dpi=DPI)
+        plt.close(fig)
+
+
+def render_knn_sweep(*paths, frames, duration):
+    class_1, class_2 = load_classes()
+    index = NeighbourIndex(class_1, class_2)
+    frames = [{'new_point': new_point, 'k': k} for new_point, k in frames]
+
+    for theme, path in zip(THEMES, paths):
+        with KnnFigure(theme, index, class_1, class_2) as template:
+            palette = template.sample_palette(frames, background=BACKGROUND_COLOR[theme])
+            with AnimationWriter(path, duration=duration, palette=palette, background=BACKGROUND_COLOR[theme]) as writer:
+                for frame in frames:
+                    template.update(**frame)
+                    writer.append(template.to_array())
+
+
+JOBS = [
+    Job(
+        name='knn',
+        fn=render_knn,
+        outputs=themed_paths(SCRIPT_PATH, 'knn'),
+        inputs=[SCRIPT_PATH / 'Iris.csv'],
+        kwargs={'n_samples': 2, 'k': 3, 'show_neighbours': False},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='knn_neighbours',
+        fn=render_knn,
+        outputs=themed_paths(SCRIPT_PATH, 'knn_neighbours'),
+        inputs=[SCRIPT_PATH / 'Iris.csv'],
+        kwargs={'n_samples': 2, 'k': 3, 'show_neighbours': True},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='knn_all',
+        fn=render_knn,
+        outputs=themed_paths(SCRIPT_PATH, 'knn_all'),
+        inputs=[SCRIPT_PATH / 'Iris.csv'],
+        kwargs={'n_samples': None, 'k': 8, 'show_neighbours': False},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='knn_decision_boundary',
+        fn=render_knn,
+        outputs=themed_paths(SCRIPT_PATH, 'knn_decision_boundary'),
+        inputs=[SCRIPT_PATH / 'Iris.csv'],
+        kwargs={'n_samples': None, 'k': 8, 'show_neighbours': False, 'show_decision_boundary': True},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='knn_k_sweep',
+        fn=render_knn_sweep,
+        outputs=themed_paths(SCRIPT_PATH, 'knn_k_sweep', suffix='.gif'),
+        inputs=[SCRIPT_PATH / 'Iris.csv'],
+        kwargs={
+            'frames': [(NEW_POINT, k) for k in K_SWEEP],
+            'duration': K_SWEEP_DURATION,
+        },
+    ),
+    Job(
+        name='knn_path_sweep',
+        fn=render_knn_sweep,
+        outputs=themed_paths(SCRIPT_PATH, 'knn_path_sweep', suffix='.gif'),
+        inputs=[SCRIPT_PATH / 'Iris.csv'],
+        kwargs={
+            'frames': [(new_point, PATH_SWEEP_K) for new_point in sweep_path(PATH_SWEEP_FRAMES)],
+            'duration': PATH_SWEEP_DURATION,
+        },
+    ),
+]
+
+
+if __name__ == '__main__':
+    run_jobs(JOBS)
@@ -1,165 +1,266 @@
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import seaborn as sns
+from matplotlib.collections import PolyCollection
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from sigmoid_media.animation import AnimationWriter
+from sigmoid_media.jobs import Job, run_jobs
+from sigmoid_media.figures import FIGURE_FORMATS, FigureTemplate
+from sigmoid_media.sampling import adaptive_sample
+from sigmoid_media.themes import BACKGROUND_COLOR, THEMES, TEXT_COLOR
+
 
 SCRIPT_PATH = Path(__file__).parent
-THEME = 'dark'
 XLIM = (0, 2)
 YLIM = (0, 16.5)
 YTICKS = np.arange(YLIM[0], YLIM[1] + 0.5, 4)
-RESOLUTION = 1000
-FUNCCOLOR = '#0A193B' if THEME == 'light' else '#9B67CC'
+FUNCCOLOR = {
+    'light': '#0A193B',
+    'dark': '#9B67CC',
+}
 FACECOLOR = '#9290F8'
-EDGECOLOR = '#3D104B' if THEME == 'light' else '#FF4DC4'
+EDGECOLOR = {
+    'light': '#3D104B',
+    'dark': '#FF4DC4',
+}
 SCATTERCOLOR = '#FF5C33'
 SCATTEREDGECOLOR = '#4D0F00'
+SCATTERSIZE = 75
 LINEWIDTH = 3
-SNS_STYLE = {
-    'grid.color': '#AAB3C8' if THEME == 'light' else '#474072',
-    'axes.facecolor': '#DCDBEE' if THEME == 'light' else '#2C2847',
-    'figure.facecolor' :'none',
-    'xtick.color': '#000000' if THEME == 'light' else '#FFFFFF',
-    'ytick.color': '#000000' if THEME == 'light' else '#FFFFFF',
-}
 DPI = 100
 ALPHA = 0.8
 ZORDER = 100
+RECTANGLE_MODES = ('left', 'right', 'midpoint', 'trapezoid')
+# where in each interval a rectangle samples f, as a fraction of its width
+SAMPLE_OFFSET = {
+    'left': 0,
+    'right': 1,
+    'midpoint': 0.5,
+}
+CONVERGENCE_N = np.unique(np.geomspace(1, 1024, 41).round().astype(int))
+CONVERGENCE_FIGSIZE = (11, 4.8)
+CONVERGENCE_DURATION = 250
+ERRORCOLOR = {
+    'light': '#B30059',
+    'dark': '#FF4DC4',
+}
+LABEL_TEXT_COLOR = TEXT_COLOR
 
 
 def f(x):
     return 16 - np.power(x, 2)
 
 
-def plot_function(ax, x, rectangle_mode, **kwargs):
-    ax.plot(
-        x,
-        f(x),
-        color=kwargs.get('funccolor', FUNCCOLOR),
-        linewidth=kwargs.get('linewidth', LINEWIDTH),
-        alpha=kwargs.get('alpha', ALPHA),
-        zorder=ZORDER,
+def antiderivative(x):
+    return 16 * x - np.power(x, 3) / 3
+
+
+def exact_integral(xlim=XLIM):
+    return antiderivative(xlim[1]) - antiderivative(xlim[0])
+
+
+def riemann_shapes(n, rectangle_mode, xlim=XLIM):
+    # (n, 4, 2) polygon vertices, wound like patches.Rectangle so the dashes line up, plus the points each shape samples f at
+    edges = np.linspace(xlim[0], xlim[1], n + 1)
+    left, right = edges[:-1], edges[1:]
+
+    if rectangle_mode == 'trapezoid':
+        x_samples = edges
+        top_left, top_right = f(left), f(right)
+    else:
+        if rectangle_mode == 'left':
+            x_samples = left
+        elif rectangle_mode == 'right':
+            x_samples = right
+        elif rectangle_mode == 'midpoint':
+            x_samples = (left + right) / 2
+        else:
+            return np.empty((0, 4, 2)), np.empty(0)
+        top_left = top_right = f(x_samples)
+
+    zeros = np.zeros(n)
+    vertices = np.stack(
+        (
+            np.column_stack((left, zeros)),
+            np.column_stack((right, zeros)),
+            np.column_stack((right, top_right)),
+            np.column_stack((left, top_left)),
+        ),
+        axis=1,
     )
 
-    xlim = kwargs.get('xlim', XLIM)
-    n = kwargs.get('n', 4)
-    x_interval = (xlim[1] - xlim[0]) / n
-
-    if rectangle_mode == 'left':
-        x_samples = np.linspace(xlim[0], xlim[1], n + 1)[:-1]
-        f_samples = f(x_samples)
-        for i in range(len(x_samples)):
-            ax.add_patch(
-                patches.Rectangle(
-                    (xlim[0] + (i * x_interval), 0),
-                    x_interval,
-                    f_samples[i],
-                    facecolor=kwargs.get('facecolor', FACECOLOR),
-                    edgecolor=kwargs.get('edgecolor', EDGECOLOR),
-                    alpha=kwargs.get('alpha', 0.5),
-                    linestyle='dashed',
-                    linewidth=kwargs.get('linewidth', LINEWIDTH),
-                    zorder=ZORDER+1,
-                ))
-        ax.scatter(
-            x_samples,
-            f_samples,
-            marker='X',
-            s=75,
-            color=kwargs.get('scattercolor', SCATTERCOLOR),
-            edgecolor=kwargs.get('scatteredgecolor', SCATTEREDGECOLOR),
-            zorder=ZORDER+2,
-        )
-    elif rectangle_mode == 'right':
-        x_samples = np.linspace(xlim[0], xlim[1], n + 1)[1:]
-        f_samples = f(x_samples)
-        for i in range(len(x_samples)):
-            ax.add_patch(
-                patches.Rectangle(
-                    (xlim[0] + (i * x_interval), 0),
-                    x_interval,
-                    f_samples[i],
-                    facecolor=kwargs.get('facecolor', FACECOLOR),
-                    edgecolor=kwargs.get('edgecolor', EDGECOLOR),
-                    alpha=kwargs.get('alpha', 0.5),
-                    linestyle='dashed',
-                    linewidth=kwargs.get('linewidth', LINEWIDTH),
-                    zorder=ZORDER+1,
-                ))
-        ax.scatter(
-            x_samples,
-            f_samples,
-            marker='X',
-            s=75,
-            color=kwargs.get('scattercolor', SCATTERCOLOR),
-            edgecolor=kwargs.get('scatteredgecolor', SCATTEREDGECOLOR),
-            zorder=ZORDER+2,
-        )
-    elif rectangle_mode == 'midpoint':
-        x_samples = np.linspace(xlim[0], xlim[1], n + 1)[:-1] + (x_interval * 0.5)
-        f_samples = f(x_samples)
-        for i in range(len(x_samples)):
-            ax.add_patch(
-                patches.Rectangle(
-                    (xlim[0] + (i * x_interval), 0),
-                    x_interval,
-                    f_samples[i],
-                    facecolor=kwargs.get('facecolor', FACECOLOR),
-                    edgecolor=kwargs.get('edgecolor', EDGECOLOR),
-                    alpha=kwargs.get('alpha', 0.5),
-                    linestyle='dashed',
-                    linewidth=kwargs.get('linewidth', LINEWIDTH),
-                    zorder=ZORDER+1,
-                ))
-        ax.scatter(
-            x_samples,
-            f_samples,
-            marker='X',
-            s=75,
-            color=kwargs.get('scattercolor', SCATTERCOLOR),
-            edgecolor=kwargs.get('scatteredgecolor', SCATTEREDGECOLOR),
-            zorder=ZORDER+2,
+    return vertices, x_samples
+
+
+def riemann_sums(ns, rectangle_mode, xlim=XLIM):
+    # every interval of every n in one flat array, summed back per n with reduceat
+    ns = np.asarray(ns)
+    widths = (xlim[1] - xlim[0]) / ns
+    starts = np.concatenate(([0], np.cumsum(ns)[:-1]))
+    h = np.repeat(widths, ns)
+    left = xlim[0] + (np.arange(ns.sum()) - np.repeat(starts, ns)) * h
+
+    if rectangle_mode == 'trapezoid':
+        heights = (f(left) + f(left + h)) / 2
+    else:
+        heights = f(left + SAMPLE_OFFSET[rectangle_mode] * h)
+
+    return np.add.reduceat(heights, starts) * widths
+
+
+class RiemannFigure(FigureTemplate):
+    def setup(self):
+        self.line, = self.ax.plot([], [], zorder=ZORDER)
+        self.rectangles = self.ax.add_collection(PolyCollection([], linestyle='dashed', zorder=ZORDER+1))
+        self.scatter = self.ax.scatter([], [], marker='X', s=SCATTERSIZE, zorder=ZORDER+2)
+
+    def update(self, x, y, rectangle_mode, **kwargs):
+        self.line.set_data(x, y)
+        self.line.set_color(kwargs.get('funccolor', FUNCCOLOR[self.theme]))
+        self.line.set_linewidth(kwargs.get('linewidth', LINEWIDTH))
+        self.line.set_alpha(kwargs.get('alpha', ALPHA))
+
+        xlim = kwargs.get('xlim', XLIM)
+        vertices, x_samples = riemann_shapes(kwargs.get('n', 4), rectangle_mode, xlim)
+
+        self.rectangles.set_verts(vertices)
+        self.rectangles.set_facecolor(kwargs.get('facecolor', FACECOLOR))
+        self.rectangles.set_edgecolor(kwargs.get('edgecolor', EDGECOLOR[self.theme]))
+        self.rectangles.set_alpha(kwargs.get('alpha', 0.5))
+        self.rectangles.set_linewidth(kwargs.get('edgewidth', kwargs.get('linewidth', LINEWIDTH)))
+
+        self.scatter.set_offsets(np.column_stack((x_samples, f(x_samples))))
+        self.scatter.set_sizes([kwargs.get('scattersize', SCATTERSIZE)])
+        self.scatter.set_facecolor(kwargs.get('scattercolor', SCATTERCOLOR))
+        self.scatter.set_edgecolor(kwargs.get('scatteredgecolor', SCATTEREDGECOLOR))
+
+        self.ax.set_xlim(xlim)
+        self.ax.set_ylim(kwargs.get('ylim', YLIM))
+        self.ax.set_yticks(kwargs.get('yticks', YTICKS))
+
+
+class ConvergenceFigure(RiemannFigure):
+    def __init__(self, theme, dpi, ns, errors):
+        self.ns = ns
+        self.errors = np.abs(errors)
+        super().__init__(theme, dpi, ncols=2, figsize=CONVERGENCE_FIGSIZE)
+
+    def setup(self):
+        self.ax, self.error_ax = self.ax
+        super().setup()
+
+        ax = self.error_ax
+        self.error_line, = ax.loglog([], [], color=ERRORCOLOR[self.theme], linewidth=LINEWIDTH, alpha=ALPHA)
+        self.error_point = ax.scatter([], [], color=SCATTERCOLOR, edgecolor=SCATTEREDGECOLOR, s=SCATTERSIZE, zorder=ZORDER)
+        ax.set_xlim(self.ns[0] / 1.5, self.ns[-1] * 1.5)
+        ax.set_ylim(self.errors.min() / 2, self.errors.max() * 2)
+        ax.set_xlabel('n', color=LABEL_TEXT_COLOR[self.theme])
+        ax.set_ylabel('|error|', color=LABEL_TEXT_COLOR[self.theme])
+        # placeholder titles so tight_layout leaves room for them
+        self.title = self.ax.set_title('n', color=LABEL_TEXT_COLOR[self.theme])
+        self.error_title = ax.set_title('n', color=LABEL_TEXT_COLOR[self.theme])
+        self.fig.tight_layout()
+
+        # the curve, axes and labels stay put, only the shapes, error trace and titles change with n
+        self.animate(self.rectangles, self.scatter, self.error_line, self.error_point, self.title, self.error_title)
+
+    def update(self, x, y, rectangle_mode, frame, **kwargs):
+        n = self.ns[frame]
+        # thin the dashed edges and markers out as the shapes get narrower
+        scale = min(1, 8 / n)
+        super().update(
+            x,
+            y,
+            rectangle_mode,
+            n=n,
+            edgewidth=LINEWIDTH * scale,
+            scattersize=SCATTERSIZE * scale,
+            **kwargs
         )
 
-    ax.set_xlim(xlim)
-    ax.set_ylim(kwargs.get('ylim', YLIM))
-    ax.set_yticks(kwargs.get('yticks', YTICKS))
+        self.error_line.set_data(self.ns[:frame + 1], self.errors[:frame + 1])
+        self.error_point.set_offsets([[n, self.errors[frame]]])
+        self.title.set_text(f'{rectangle_mode.capitalize()} sum, n = {n}')
+        self.error_title.set_text(f'|error| = {self.errors[frame]:.2e}')
 
 
-if __name__ == '__main__':
-    sns.set_theme()
-    sns.set_style('darkgrid', SNS_STYLE)
+def render_function(path, theme, rectangle_mode, kwargs):
+    x, y = adaptive_sample(f, XLIM, y_span=YLIM[1] - YLIM[0])
+
+    with RiemannFigure(theme, DPI) as template:
+        template.render(path, x=x, y=y, rectangle_mode=rectangle_mode, **kwargs)
+
 
-    config = {
-        'function': {
-            'rectangle_mode': 'none',
-            'kwargs': {},
+def render_convergence(path, theme, rectangle_mode, ns, duration):
+    # one GIF per job so the eight of them spread over the workers
+    x, y = adaptive_sample(f, XLIM, y_span=YLIM[1] - YLIM[0])
+    errors = riemann_sums(ns, rectangle_mode) - exact_integral()
+
+    with ConvergenceFigure(theme, DPI, ns, errors) as template:
+        frames = [{'x': x, 'y': y, 'rectangle_mode': rectangle_mode, 'frame': frame} for frame in range(len(ns))]
+        palette = template.sample_palette(frames, background=BACKGROUND_COLOR[theme])
+        with AnimationWriter(path, duration=duration, palette=palette, background=BACKGROUND_COLOR[theme]) as writer:
+            for frame in frames:
+                template.update(**frame)
+                writer.append(template.to_array())
+
+
+config = {
+    'function': {
+        'rectangle_mode': 'none',
+        'kwargs': {},
+    },
+    'left_riemann_sum': {
+        'rectangle_mode': 'left',
+        'kwargs': {
+            'n': 4,
         },
-        'left_riemann_sum': {
-            'rectangle_mode': 'left',
-            'kwargs': {
-                'n': 4,
-            },
+    },
+    'right_riemann_sum': {
+        'rectangle_mode': 'right',
+        'kwargs': {
+            'n': 4,
         },
-        'right_riemann_sum': {
-            'rectangle_mode': 'right',
-            'kwargs': {
-                'n': 4,
-            },
+    },
+    'midpoint_riemann_sum': {
+        'rectangle_mode': 'midpoint',
+        'kwargs': {
+            'n': 4,
         },
-        'midpoint_riemann_sum': {
-            'rectangle_mode': 'midpoint',
-            'kwargs': {
-                'n': 4,
+    },
+}
+
+JOBS = [
+    # one job per image, so each can be targeted and cached on its own
+    *[
+        Job(
+            name=f'{name}_{theme}',
+            fn=render_function,
+            outputs=[SCRIPT_PATH / f'{name}_{theme}.png'],
+            kwargs={'theme': theme, 'rectangle_mode': cfg['rectangle_mode'], 'kwargs': cfg['kwargs']},
+            formats=FIGURE_FORMATS,
+        )
+        for theme in THEMES
+        for name, cfg in config.items()
+    ],
+    *[
+        Job(
+            name=f'{rectangle_mode}_riemann_sum_convergence_{theme}',
+            fn=render_convergence,
+            outputs=[SCRIPT_PATH / f'{rectangle_mode}_riemann_sum_convergence_{theme}.gif'],
+            kwargs={
+                'theme': theme,
+                'rectangle_mode': rectangle_mode,
+                'ns': CONVERGENCE_N,
+                'duration': CONVERGENCE_DURATION,
             },
-        },
-    }
+        )
+        for theme in THEMES
+        for rectangle_mode in RECTANGLE_MODES
+    ],
+]
 
-    x = np.linspace(*XLIM, RESOLUTION)
 
-    for name, cfg in config.items():
-        fig, ax = plt.subplots()
-        plot_function(ax, x, cfg['rectangle_mode'], **cfg['kwargs'])
-        plt.savefig(SCRIPT_PATH / f'{name}_{THEME}.png', dpi=DPI)
+if __name__ == '__main__':
+    run_jobs(JOBS)
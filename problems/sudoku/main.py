@@ -1,6 +1,17 @@
+import sys
+import contextlib
+import functools
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from pathlib import Path
+from PIL import Image
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from sigmoid_media.animation import AnimationWriter, build_palette
+from sigmoid_media.figures import FIGURE_FORMATS, figure_to_array, save_figure
+from sigmoid_media.jobs import Job, run_jobs
+from sigmoid_media.themes import BACKGROUND_COLOR, THEMES, themed_paths
 
 
 SCRIPT_PATH = Path(__file__).parent
@@ -30,6 +41,20 @@ INVALID_SUDOKU = np.array(
         [4, 9, 6, 7, 5, 3, 1, 8, 2],
     ],
 )
+# blanks are 0, a hard puzzle that takes the solver about 17000 placements and backtracks
+HARD_SUDOKU = np.array(
+    [
+        [8, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 3, 6, 0, 0, 0, 0, 0],
+        [0, 7, 0, 0, 9, 0, 2, 0, 0],
+        [0, 5, 0, 0, 0, 7, 0, 0, 0],
+        [0, 0, 0, 0, 4, 5, 7, 0, 0],
+        [0, 0, 0, 1, 0, 0, 0, 3, 0],
+        [0, 0, 1, 0, 0, 0, 0, 6, 8],
+        [0, 0, 8, 5, 0, 0, 0, 1, 0],
+        [0, 9, 0, 0, 0, 0, 4, 0, 0],
+    ],
+)
 DARK_TEXT_COLOR = '#0D001A'
 LIGHT_TEXT_COLOR = '#F3E6FF'
 DARK_BG_COLOR = '#C2ACD1'
@@ -39,9 +64,76 @@ MARK_BG_COLOR = '#B30059'
 FONTSIZE = 12
 FIGSIZE = (4, 4)
 DPI = 100
+# pixel grid of the tile backend, close to where tight_layout puts the 81 axes at FIGSIZE and DPI
+TILE_SIZE = 28
+TILE_PITCH = 43
+TILE_OFFSET = 7
+BOARD_MARGIN = (FIGSIZE[0] * DPI - 9 * TILE_PITCH) // 2
+REGION_TYPES = ('row', 'column', 'square')
+# bit d set means digit d is taken, bit 0 is unused
+DIGIT_BITS = 0b1111111110
+POPCOUNT = [bin(mask).count('1') for mask in range(1 << 10)]
+CELL_SQUARES = [(cell // 27) * 3 + (cell % 9) // 3 for cell in range(81)]
+SOLVER_FRAMES = 150
+SOLVER_DURATION = 80
+SOLVER_HOLD_FRAMES = 25
+COMPOSE_BATCH = 32
+
+
+def find_conflicts(sudokus):
+    # (N, 9, 9) boards in, (N, 3, 9, 9) masks of cells whose value repeats in their row, column or square
+    sudokus = np.asarray(sudokus)
+    n = len(sudokus)
+    onehot = sudokus[..., np.newaxis] == np.arange(1, 10)
+
+    repeated_rows = onehot.sum(axis=2, keepdims=True) > 1
+    repeated_columns = onehot.sum(axis=1, keepdims=True) > 1
+    squares = onehot.reshape(n, 3, 3, 3, 3, 9)
+    repeated_squares = np.broadcast_to(squares.sum(axis=(2, 4), keepdims=True) > 1, squares.shape).reshape(n, 9, 9, 9)
+
+    return np.stack(
+        [
+            (onehot & repeated_rows).any(axis=-1),
+            (onehot & repeated_columns).any(axis=-1),
+            (onehot & repeated_squares).any(axis=-1),
+        ],
+        axis=1,
+    )
+
+
+def find_annotations(sudokus):
+    # one draw_sudoku annotation per board, region and repeated value
+    sudokus = np.asarray(sudokus)
+    boards, regions, i, j = np.nonzero(find_conflicts(sudokus))
+    region_idx = np.choose(regions, [i, j, (i // 3) * 3 + j // 3])
+    values = sudokus[boards, i, j]
+
+    # lexsort is stable, so cells within a group stay in row-major order
+    order = np.lexsort((values, region_idx, regions, boards))
+    groups = np.stack([boards, regions, region_idx, values], axis=1)[order]
+    starts = np.flatnonzero(np.any(np.diff(groups, axis=0, prepend=-1), axis=1))
+
+    annotations = [[] for _ in range(len(sudokus))]
+    for start, end in zip(starts, np.append(starts[1:], len(order))):
+        board, region, idx, _ = groups[start]
+        annotations[board].append({
+            'highlight_idx': int(idx),
+            'highlight_type': REGION_TYPES[region],
+            'mark_cells': [(int(i[k]), int(j[k])) for k in order[start:end]],
+        })
+
+    return annotations
 
 
-def draw_sudoku(ax, sudoku, highlight_idx=None, highlight_type=None, mark_cells=[]):
+def pick_annotation(annotations, highlight_type, highlight_idx):
+    return next(
+        annotation
+        for annotation in annotations
+        if annotation['highlight_type'] == highlight_type and annotation['highlight_idx'] == highlight_idx
+    )
+
+
+def cell_colors(highlight_idx=None, highlight_type=None, mark_cells=[]):
     text_colors = np.full((9, 9), fill_value=DARK_TEXT_COLOR, dtype='U7')
     bg_colors = np.full((9, 9), fill_value=LIGHT_BG_COLOR, dtype='U7')
     for idx in range(0, 9, 2):
@@ -66,6 +158,11 @@ def draw_sudoku(ax, sudoku, highlight_idx=None, highlight_type=None, mark_cells=
         text_colors[cell_idx] = LIGHT_TEXT_COLOR
         bg_colors[cell_idx] = MARK_BG_COLOR
 
+    return text_colors, bg_colors
+
+
+def draw_sudoku(ax, sudoku, **kwargs):
+    text_colors, bg_colors = cell_colors(**kwargs)
     for i in range(9):
         for j in range(9):
             ax[i, j].set_xticks([])
@@ -74,7 +171,7 @@ def draw_sudoku(ax, sudoku, highlight_idx=None, highlight_type=None, mark_cells=
             ax[i, j].text(
                 0.5,
                 0.5,
-                str(sudoku[i, j]),
+                str(sudoku[i, j]) if sudoku[i, j] else '',
                 color=text_colors[i, j],
                 fontsize=FONTSIZE,
                 ha='center',
@@ -82,43 +179,247 @@ def draw_sudoku(ax, sudoku, highlight_idx=None, highlight_type=None, mark_cells=
             )
 
 
+@functools.lru_cache(maxsize=None)
+def render_tile(digit, text_color, bg_color):
+    # one cell with its frame, on a transparent square of TILE_PITCH so tiles butt together into the grid
+    fig = Figure(figsize=(TILE_PITCH / DPI, TILE_PITCH / DPI), dpi=DPI, facecolor='none')
+    ax = fig.add_axes([
+        TILE_OFFSET / TILE_PITCH,
+        (TILE_PITCH - TILE_OFFSET - TILE_SIZE) / TILE_PITCH,
+        TILE_SIZE / TILE_PITCH,
+        TILE_SIZE / TILE_PITCH,
+    ])
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_facecolor(bg_color)
+    ax.text(
+        0.5,
+        0.5,
+        str(digit) if digit else '',
+        color=text_color,
+        fontsize=FONTSIZE,
+        ha='center',
+        va='center',
+    )
+
+    return figure_to_array(fig)
+
+
+def compose_boards(sudokus, text_colors, bg_colors):
+    # (N, 9, 9) digits and colours in, (N, height, width, 4) images out
+    sudokus = np.asarray(sudokus)
+    text_names, text_codes = np.unique(text_colors, return_inverse=True)
+    bg_names, bg_codes = np.unique(bg_colors, return_inverse=True)
+    keys = (sudokus.ravel() * len(text_names) + text_codes.ravel()) * len(bg_names) + bg_codes.ravel()
+    unique_keys, tile_ids = np.unique(keys, return_inverse=True)
+
+    tiles = []
+    for key in unique_keys:
+        digit, style = divmod(int(key), len(text_names) * len(bg_names))
+        tiles.append(render_tile(digit, text_names[style // len(bg_names)], bg_names[style % len(bg_names)]))
+
+    boards = np.stack(tiles)[tile_ids.reshape(sudokus.shape)]
+    boards = boards.transpose(0, 1, 3, 2, 4, 5).reshape(len(sudokus), 9 * TILE_PITCH, 9 * TILE_PITCH, 4)
+    margin = (BOARD_MARGIN, FIGSIZE[0] * DPI - 9 * TILE_PITCH - BOARD_MARGIN)
+
+    return np.pad(boards, ((0, 0), margin, margin, (0, 0)))
+
+
+def solve_trace(sudoku):
+    # trace entries are cell * 10 + digit, digit 0 when a backtrack clears the cell
+    if find_conflicts(np.asarray(sudoku)[np.newaxis]).any():
+        raise ValueError('Sudoku givens repeat a value')
+
+    board = np.asarray(sudoku).ravel().tolist()
+    rows, columns, squares = [0] * 9, [0] * 9, [0] * 9
+    for cell, digit in enumerate(board):
+        if digit:
+            rows[cell // 9] |= 1 << digit
+            columns[cell % 9] |= 1 << digit
+            squares[CELL_SQUARES[cell]] |= 1 << digit
+    empty = {cell for cell, digit in enumerate(board) if not digit}
+    trace = []
+
+    def search():
+        if not empty:
+            return True
+
+        # most constrained cell first, so forced cells are placed without branching and dead ends fail at once
+        best, best_count, best_mask = None, 10, 0
+        for cell in empty:
+            mask = DIGIT_BITS & ~(rows[cell // 9] | columns[cell % 9] | squares[CELL_SQUARES[cell]])
+            if POPCOUNT[mask] < best_count:
+                best, best_count, best_mask = cell, POPCOUNT[mask], mask
+                if best_count <= 1:
+                    break
+
+        row, column, square = best // 9, best % 9, CELL_SQUARES[best]
+        empty.remove(best)
+        while best_mask:
+            bit = best_mask & -best_mask
+            best_mask ^= bit
+            rows[row] |= bit
+            columns[column] |= bit
+            squares[square] |= bit
+            board[best] = bit.bit_length() - 1
+            trace.append(best * 10 + board[best])
+            if search():
+                return True
+
+            rows[row] ^= bit
+            columns[column] ^= bit
+            squares[square] ^= bit
+            board[best] = 0
+            trace.append(best * 10)
+        empty.add(best)
+
+        return False
+
+    if not search():
+        raise ValueError('Sudoku has no solution')
+
+    return np.array(board).reshape(9, 9), np.array(trace, dtype=np.int16)
+
+
+def trace_frames(sudoku, trace, budget):
+    # board states at up to budget evenly spaced trace steps, with the changed cell, skipping repeated states
+    cells, digits = trace // 10, trace % 10
+    positions = np.unique(np.linspace(0, len(trace), budget).round().astype(int))
+    board = np.asarray(sudoku).ravel().copy()
+    boards, current = [board.copy()], [-1]
+    for start, end in zip(positions[:-1], positions[1:]):
+        # only the last event on each cell in the span matters
+        changed, last = np.unique(cells[start:end][::-1], return_index=True)
+        board[changed] = digits[start:end][::-1][last]
+        if np.array_equal(board, boards[-1]):
+            continue
+        boards.append(board.copy())
+        current.append(cells[end - 1])
+
+    return np.array(boards).reshape(-1, 9, 9), np.array(current)
+
+
+def solver_colors(sudoku, boards, current):
+    text_colors, bg_colors = cell_colors()
+    placed = (boards != 0) & (np.asarray(sudoku) == 0)
+    text_colors = np.where(placed, LIGHT_TEXT_COLOR, text_colors)
+    bg_colors = np.where(placed, HIGHLIGHT_BG_COLOR, bg_colors)
+
+    frames = np.flatnonzero(current >= 0)
+    text_colors.reshape(-1, 81)[frames, current[frames]] = LIGHT_TEXT_COLOR
+    bg_colors.reshape(-1, 81)[frames, current[frames]] = MARK_BG_COLOR
+
+    return text_colors, bg_colors
+
+
+def render_solver(*paths, sudoku, frames, duration):
+    solution, trace = solve_trace(sudoku)
+    boards, current = trace_frames(sudoku, trace, frames)
+    text_colors, bg_colors = solver_colors(sudoku, boards, current)
+    final, = compose_boards(solution[np.newaxis], *solver_colors(sudoku, solution[np.newaxis], np.array([-1])))
+    samples = compose_boards(boards[-2:], text_colors[-2:], bg_colors[-2:])
+
+    # boards are composed once and flattened onto each theme's background, like the static boards on the page
+    with contextlib.ExitStack() as stack:
+        writers = [
+            stack.enter_context(AnimationWriter(
+                path,
+                duration=duration,
+                palette=build_palette([*samples, final], background=BACKGROUND_COLOR[theme]),
+                background=BACKGROUND_COLOR[theme],
+            ))
+            for theme, path in zip(THEMES, paths)
+        ]
+        for start in range(0, len(boards), COMPOSE_BATCH):
+            batch = slice(start, start + COMPOSE_BATCH)
+            for frame in compose_boards(boards[batch], text_colors[batch], bg_colors[batch]):
+                for writer in writers:
+                    writer.append(frame)
+        for _ in range(SOLVER_HOLD_FRAMES):
+            for writer in writers:
+                writer.append(final)
+
+
+def render_sudoku(path, sudoku, **kwargs):
+    if Path(path).suffix == '.svg':
+        fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
+        draw_sudoku(ax, sudoku, **kwargs)
+        plt.tight_layout()
+        save_figure(fig, path, dpi=DPI)
+        plt.close(fig)
+        return
+
+    text_colors, bg_colors = cell_colors(**kwargs)
+    board, = compose_boards(sudoku[np.newaxis], text_colors[np.newaxis], bg_colors[np.newaxis])
+    Image.fromarray(board).save(path)
+
+
+INVALID_ANNOTATIONS = find_annotations(INVALID_SUDOKU[np.newaxis])[0]
+JOBS = [
+    Job(
+        name='valid_sudoku',
+        fn=render_sudoku,
+        outputs=[SCRIPT_PATH / 'valid_sudoku.png'],
+        kwargs={'sudoku': VALID_SUDOKU},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='valid_sudoku_row_highlighted',
+        fn=render_sudoku,
+        outputs=[SCRIPT_PATH / 'valid_sudoku_row_highlighted.png'],
+        kwargs={'sudoku': VALID_SUDOKU, 'highlight_idx': 3, 'highlight_type': 'row'},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='valid_sudoku_column_highlighted',
+        fn=render_sudoku,
+        outputs=[SCRIPT_PATH / 'valid_sudoku_column_highlighted.png'],
+        kwargs={'sudoku': VALID_SUDOKU, 'highlight_idx': 2, 'highlight_type': 'column'},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='valid_sudoku_square_highlighted',
+        fn=render_sudoku,
+        outputs=[SCRIPT_PATH / 'valid_sudoku_square_highlighted.png'],
+        kwargs={'sudoku': VALID_SUDOKU, 'highlight_idx': 3, 'highlight_type': 'square'},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='invalid_sudoku',
+        fn=render_sudoku,
+        outputs=[SCRIPT_PATH / 'invalid_sudoku.png'],
+        kwargs={'sudoku': INVALID_SUDOKU},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='invalid_sudoku_row_highlighted',
+        fn=render_sudoku,
+        outputs=[SCRIPT_PATH / 'invalid_sudoku_row_highlighted.png'],
+        kwargs={'sudoku': INVALID_SUDOKU, **pick_annotation(INVALID_ANNOTATIONS, 'row', 6)},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='invalid_sudoku_column_highlighted',
+        fn=render_sudoku,
+        outputs=[SCRIPT_PATH / 'invalid_sudoku_column_highlighted.png'],
+        kwargs={'sudoku': INVALID_SUDOKU, **pick_annotation(INVALID_ANNOTATIONS, 'column', 5)},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='invalid_sudoku_square_highlighted',
+        fn=render_sudoku,
+        outputs=[SCRIPT_PATH / 'invalid_sudoku_square_highlighted.png'],
+        kwargs={'sudoku': INVALID_SUDOKU, **pick_annotation(INVALID_ANNOTATIONS, 'square', 5)},
+        formats=FIGURE_FORMATS,
+    ),
+    Job(
+        name='sudoku_solver',
+        fn=render_solver,
+        outputs=themed_paths(SCRIPT_PATH, 'sudoku_solver', suffix='.gif'),
+        kwargs={'sudoku': HARD_SUDOKU, 'frames': SOLVER_FRAMES, 'duration': SOLVER_DURATION},
+    ),
+]
+
+
 if __name__ == '__main__':
-    fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
-    draw_sudoku(ax, VALID_SUDOKU)
-    plt.tight_layout()
-    plt.savefig(SCRIPT_PATH / 'valid_sudoku.png', dpi=DPI)
-
-    fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
-    draw_sudoku(ax, VALID_SUDOKU, highlight_idx=3, highlight_type='row')
-    plt.tight_layout()
-    plt.savefig(SCRIPT_PATH / 'valid_sudoku_row_highlighted.png', dpi=DPI)
-
-    fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
-    draw_sudoku(ax, VALID_SUDOKU, highlight_idx=2, highlight_type='column')
-    plt.tight_layout()
-    plt.savefig(SCRIPT_PATH / 'valid_sudoku_column_highlighted.png', dpi=DPI)
-
-    fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
-    draw_sudoku(ax, VALID_SUDOKU, highlight_idx=3, highlight_type='square')
-    plt.tight_layout()
-    plt.savefig(SCRIPT_PATH / 'valid_sudoku_square_highlighted.png', dpi=DPI)
-
-    fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
-    draw_sudoku(ax, INVALID_SUDOKU)
-    plt.tight_layout()
-    plt.savefig(SCRIPT_PATH / 'invalid_sudoku.png', dpi=DPI)
-
-    fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
-    draw_sudoku(ax, INVALID_SUDOKU, highlight_idx=6, highlight_type='row', mark_cells=[(6, 1), (6, 8)])
-    plt.tight_layout()
-    plt.savefig(SCRIPT_PATH / 'invalid_sudoku_row_highlighted.png', dpi=DPI)
-
-    fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
-    draw_sudoku(ax, INVALID_SUDOKU, highlight_idx=5, highlight_type='column', mark_cells=[(1, 5), (3, 5)])
-    plt.tight_layout()
-    plt.savefig(SCRIPT_PATH / 'invalid_sudoku_column_highlighted.png', dpi=DPI)
-
-    fig, ax = plt.subplots(9, 9, figsize=FIGSIZE, facecolor='none')
-    draw_sudoku(ax, INVALID_SUDOKU, highlight_idx=5, highlight_type='square', mark_cells=[(4, 6), (5, 6)])
-    plt.tight_layout()
-    plt.savefig(SCRIPT_PATH / 'invalid_sudoku_square_highlighted.png', dpi=DPI)
+    run_jobs(JOBS)
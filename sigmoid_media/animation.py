@@ -0,0 +1,145 @@
+import re
+import numpy as np
+from pathlib import Path
+from PIL import Image, GifImagePlugin
+
+
+BACKGROUND = (255, 255, 255)
+PALETTE_SAMPLE_SIZE = 256
+PALETTE_SAMPLE_FRAMES = 16
+
+
+def natural_key(path):
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', Path(path).name)]
+
+
+def to_rgb(frame, background=BACKGROUND):
+    if isinstance(frame, (str, Path)):
+        frame = Image.open(frame)
+    elif not isinstance(frame, Image.Image):
+        frame = Image.fromarray(np.asarray(frame))
+
+    if frame.mode in ('RGBA', 'LA', 'P'):
+        frame = frame.convert('RGBA')
+        canvas = Image.new('RGBA', frame.size, background + (255,))
+        canvas.alpha_composite(frame)
+        frame = canvas
+
+    return frame.convert('RGB')
+
+
+def build_palette(
+    frames,
+    colors=256,
+    sample_size=PALETTE_SAMPLE_SIZE,
+    sample_frames=PALETTE_SAMPLE_FRAMES,
+    background=BACKGROUND,
+):
+    # tile thumbnails of evenly spaced frames so the palette costs a fixed amount of memory
+    frames = list(frames)
+    frames = frames[::max(1, -(-len(frames) // sample_frames))]
+
+    thumbnails = []
+    for frame in frames:
+        thumbnail = to_rgb(frame, background)
+        thumbnail.thumbnail((sample_size, sample_size), Image.NEAREST)
+        thumbnails.append(thumbnail)
+
+    sheet = Image.new('RGB', (sample_size, sample_size * len(thumbnails)), background)
+    for i, thumbnail in enumerate(thumbnails):
+        sheet.paste(thumbnail, (0, i * sample_size))
+
+    # the background fills most of every frame, so it gets an exact entry rather than a median-cut average
+    palette = sheet.quantize(colors=colors - 1, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    palette.putpalette(palette.getpalette()[:3 * (colors - 1)] + list(background))
+
+    return palette
+
+
+def pack_rgb(rgb):
+    rgb = np.asarray(rgb, dtype=np.uint32)
+
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def quantize(frame, palette, background=BACKGROUND):
+    # Pillow's palette lookup is approximate and can miss even an exact entry, which tints the background
+    indices = np.asarray(frame.quantize(palette=palette, dither=Image.Dither.NONE)).copy()
+    entries = np.flatnonzero(pack_rgb(np.reshape(palette.getpalette()[:768], (-1, 3))) == pack_rgb(background))
+    if len(entries):
+        indices[pack_rgb(frame) == pack_rgb(background)] = entries[0]
+
+    quantized = Image.fromarray(indices, mode='P')
+    quantized.putpalette(palette.getpalette())
+
+    return quantized
+
+
+class AnimationWriter:
+    def __init__(self, path, duration, loop=0, palette=None, background=BACKGROUND):
+        self.path = Path(path)
+        self.duration = duration
+        self.loop = loop
+        self.palette = palette
+        self.background = background
+        self.frames = 0
+        self._fp = None
+        self._previous = None
+        self._pending = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if exc_type is not None:
+            self.path.unlink(missing_ok=True)
+
+    def append(self, frame):
+        frame = to_rgb(frame, self.background)
+        if self.palette is None:
+            self.palette = build_palette([frame], background=self.background)
+
+        quantized = quantize(frame, self.palette, self.background)
+        indices = np.asarray(quantized)
+        self.frames += 1
+
+        if self._fp is None:
+            self._fp = open(self.path, 'wb')
+            header, _ = GifImagePlugin.getheader(quantized, info={'loop': self.loop, 'duration': self.duration})
+            self._fp.writelines(header)
+            self._pending = [quantized, (0, 0), self.duration]
+            self._previous = indices
+            return
+
+        # later frames only carry the box that changed, drawn over the previous one
+        changed = indices != self._previous
+        if not changed.any():
+            self._pending[2] += self.duration
+            return
+
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        box = (cols[0], rows[0], cols[-1] + 1, rows[-1] + 1)
+        self.flush()
+        self._pending = [quantized.crop(box), box[:2], self.duration]
+        self._previous = indices
+
+    def flush(self):
+        if self._pending is not None:
+            image, offset, duration = self._pending
+            self._fp.writelines(GifImagePlugin.getdata(image, offset=offset, duration=duration, disposal=1))
+            self._pending = None
+
+    def close(self):
+        if self._fp is not None:
+            self.flush()
+            self._fp.write(b';')
+            self._fp.close()
+            self._fp = None
+
+
+def write_animation(path, frames, duration, loop=0, palette=None, background=BACKGROUND):
+    with AnimationWriter(path, duration=duration, loop=loop, palette=palette, background=background) as writer:
+        for frame in frames:
+            writer.append(frame)
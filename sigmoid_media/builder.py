@@ -0,0 +1,108 @@
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+
+from sigmoid_media.cache import job_key, load_manifest, restore, save_manifest, source_digest, store
+from sigmoid_media.jobs import ROOT_PATH, discover_scripts, forget_scripts, load_jobs, script_name
+from sigmoid_media.optimize import optimize_png, update_manifest
+from sigmoid_media.scheduler import run_parallel
+
+
+def run_job(script, name, suffix=None, use_cache=True, optimize=False):
+    plt.close('all')
+    matplotlib.rcdefaults()
+
+    start = time.perf_counter()
+    job = load_jobs(script)[name]
+    if suffix is not None:
+        job = job.as_format(suffix)
+
+    key = job_key(script, job, variant='optimized' if optimize else '') if use_cache else None
+    if key is not None and restore(key, load_manifest()):
+        return time.perf_counter() - start, key, None, {}
+
+    job.run()
+
+    # shrink PNGs in place and add a WebP next to each, in the worker that rendered them
+    paths = list(job.outputs)
+    records = {}
+    if optimize:
+        for path in job.outputs:
+            if path.suffix == '.png':
+                records[path.resolve().relative_to(ROOT_PATH).as_posix()] = optimize_png(path)
+                paths.append(path.with_suffix('.webp'))
+    entry = store(paths) if key is not None else None
+
+    return time.perf_counter() - start, key, entry, records
+
+
+def matches_target(name, target):
+    # whole path segments only, so problems/knn matches problems/knn/knn_all but not problems/knn2
+    target = target.rstrip('/')
+
+    return name == target or name.startswith(target + '/')
+
+
+def collect_jobs(targets, suffix=None):
+    jobs = {}
+
+    def add(script, script_jobs, job):
+        if (script, job.name) in jobs:
+            return
+
+        # dependencies first, so the listing reads in build order
+        for dep in job.deps:
+            add(script, script_jobs, script_jobs[dep])
+
+        jobs[(script, job.name)] = job
+
+    for script in discover_scripts():
+        prefix = script_name(script)
+        script_jobs = load_jobs(script)
+        for job in script_jobs.values():
+            if suffix is not None and suffix not in job.formats:
+                continue
+            if not targets or any(matches_target(f'{prefix}/{job.name}', target) for target in targets):
+                add(script, script_jobs, job if suffix is None else job.as_format(suffix))
+
+    return jobs
+
+
+def finish_job(manifest, script, name, result):
+    elapsed, key, entry, records = result
+    if records:
+        update_manifest(records)
+    if entry is None:
+        return f'{script_name(script)}/{name} ({"cached" if key else f"{elapsed:.2f}s"})'
+
+    manifest[key] = entry
+    save_manifest(manifest)
+
+    return f'{script_name(script)}/{name} ({elapsed:.2f}s)'
+
+
+def build(jobs, workers, suffix=None, use_cache=True, optimize=False):
+    manifest = load_manifest()
+    tasks = {
+        key: ([(key[0], dep) for dep in job.deps], run_job, (*key, suffix, use_cache, optimize))
+        for key, job in jobs.items()
+    }
+    for (script, name), result in run_parallel(tasks, workers):
+        yield finish_job(manifest, script, name, result)
+
+
+def build_warm(payload):
+    # runs inside the render worker, re-reading scripts so edits since the last request are picked up
+    forget_scripts()
+    source_digest.cache_clear()
+
+    manifest = load_manifest()
+    jobs = collect_jobs(payload['targets'], suffix=payload['suffix'])
+    for script, name in jobs:
+        result = run_job(script, name, payload['suffix'], payload['use_cache'], payload['optimize'])
+        yield finish_job(manifest, script, name, result)
+    yield f'Built {len(jobs)} jobs in the warm worker'
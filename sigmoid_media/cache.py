@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import functools
+import importlib.metadata
+import numpy as np
+from pathlib import Path
+
+from sigmoid_media.digest import file_digest
+from sigmoid_media.jobs import ROOT_PATH, load_jobs, script_name
+
+
+CACHE_PATH = ROOT_PATH / '.cache' / 'renders'
+OBJECTS_PATH = CACHE_PATH / 'objects'
+MANIFEST_PATH = CACHE_PATH / 'manifest.json'
+LIBRARIES = (
+    'numpy',
+    'matplotlib',
+    'seaborn',
+    'pandas',
+    'scikit-learn',
+    'scipy',
+    'Pillow',
+    'imageio',
+)
+SHARED_SOURCES = ROOT_PATH / 'sigmoid_media'
+
+
+def fingerprint(value):
+    # a stable string for anything that shows up in job kwargs, arrays by content rather than repr
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return f'ndarray({value.shape}, {fingerprint(value.tolist())})'
+        return f'ndarray({value.dtype.str}, {value.shape}, {hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()})'
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{fingerprint(k)}: {fingerprint(v)}' for k, v in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__ + '[' + ', '.join(fingerprint(v) for v in value) + ']'
+    if isinstance(value, Path):
+        return f'Path({value.resolve().relative_to(ROOT_PATH).as_posix()})'
+    if callable(value):
+        # the code itself is covered by the source digests
+        return f'{value.__module__}.{value.__qualname__}'
+
+    return repr(value)
+
+
+@functools.lru_cache(maxsize=None)
+def environment_digest():
+    digest = hashlib.sha256(sys.version.encode())
+    for library in LIBRARIES:
+        try:
+            version = importlib.metadata.version(library)
+        except importlib.metadata.PackageNotFoundError:
+            version = None
+        digest.update(f'{library}=={version}'.encode())
+    for path in sorted(SHARED_SOURCES.glob('*.py')):
+        digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def source_digest(script):
+    return file_digest(script)
+
+
+def job_key(script, job, jobs=None, variant=''):
+    # code, constants (they live in the source), kwargs, input data, library versions and dependency keys
+    jobs = jobs if jobs is not None else load_jobs(script)
+    digest = hashlib.sha256()
+    digest.update(environment_digest().encode())
+    digest.update(source_digest(Path(script).resolve()).encode())
+    digest.update(f'{script_name(script)}/{job.name}:{variant}'.encode())
+    digest.update(fingerprint(job.outputs).encode())
+    digest.update(fingerprint(job.kwargs).encode())
+    for path in job.inputs:
+        digest.update(file_digest(path).encode())
+    for dep in job.deps:
+        digest.update(job_key(script, jobs[dep], jobs).encode())
+
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not path.exists():
+        return {}
+
+    return json.loads(path.read_text())
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=4, sort_keys=True))
+    os.replace(tmp_path, path)
+
+
+def restore(key, manifest):
+    # outputs already on disk are kept, missing or stale ones are copied back from the object store
+    entry = manifest.get(key)
+    if entry is None:
+        return False
+
+    for name, digest in entry.items():
+        path = ROOT_PATH / name
+        if path.exists() and file_digest(path) == digest:
+            continue
+        if not (OBJECTS_PATH / digest).exists():
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(OBJECTS_PATH / digest, path)
+
+    return True
+
+
+def store(paths):
+    OBJECTS_PATH.mkdir(parents=True, exist_ok=True)
+    entry = {}
+    for path in paths:
+        digest = file_digest(path)
+        if not (OBJECTS_PATH / digest).exists():
+            # copy then rename, so a concurrent reader never sees half a file
+            tmp_path = OBJECTS_PATH / f'{digest}.{os.getpid()}.tmp'
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, OBJECTS_PATH / digest)
+        entry[path.resolve().relative_to(ROOT_PATH).as_posix()] = digest
+
+    return entry
@@ -0,0 +1,89 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from matplotlib import font_manager
+
+
+HEADING_FONT_SIZE = 32
+HEADING_MARGIN = 21
+PADDING = 20
+BACKGROUND = (255, 255, 255)
+TEXT_COLOR = (0, 0, 0)
+
+
+def load_font(size, weight='bold'):
+    path = font_manager.findfont(font_manager.FontProperties(family='sans-serif', weight=weight))
+
+    return ImageFont.truetype(path, size)
+
+
+class Panel:
+    def __init__(self, image, width):
+        if not isinstance(image, Image.Image):
+            image = Image.fromarray(np.asarray(image))
+        height = round(image.height * width / image.width)
+        self.image = image.convert('RGBA').resize((width, height), Image.LANCZOS)
+
+    def size(self):
+        return self.image.size
+
+    def draw(self, canvas, x, y):
+        canvas.alpha_composite(self.image, (x, y))
+
+
+class Heading:
+    def __init__(self, text, font_size=HEADING_FONT_SIZE, margin=HEADING_MARGIN):
+        self.text = text
+        self.font = load_font(font_size)
+        self.margin = margin
+
+    def size(self):
+        left, top, right, bottom = self.font.getbbox(self.text)
+        ascent, descent = self.font.getmetrics()
+
+        return right - left, ascent + descent + 2 * self.margin
+
+    def draw(self, canvas, x, y):
+        left, _, _, _ = self.font.getbbox(self.text)
+        ImageDraw.Draw(canvas).text((x - left, y + self.margin), self.text, font=self.font, fill=TEXT_COLOR)
+
+
+class Stack:
+    def __init__(self, *children, direction='column', padding=PADDING):
+        self.children = children
+        self.direction = direction
+        self.padding = padding
+
+    def size(self):
+        sizes = [child.size() for child in self.children]
+        if self.direction == 'row':
+            width = sum(w for w, _ in sizes)
+            height = max(h for _, h in sizes)
+        else:
+            width = max(w for w, _ in sizes)
+            height = sum(h for _, h in sizes)
+
+        return width + 2 * self.padding, height + 2 * self.padding
+
+    def draw(self, canvas, x, y):
+        width, height = self.size()
+        x += self.padding
+        y += self.padding
+        for child in self.children:
+            w, h = child.size()
+            # children are centred on the cross axis
+            if self.direction == 'row':
+                child.draw(canvas, x, y + (height - 2 * self.padding - h) // 2)
+                x += w
+            else:
+                child.draw(canvas, x + (width - 2 * self.padding - w) // 2, y)
+                y += h
+
+
+def compose(layout, width=None, background=BACKGROUND):
+    content_width, content_height = layout.size()
+    width = max(width or 0, content_width)
+
+    canvas = Image.new('RGBA', (width, content_height), background + (255,))
+    layout.draw(canvas, (width - content_width) // 2, 0)
+
+    return canvas.convert('RGB')
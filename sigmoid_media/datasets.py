@@ -0,0 +1,106 @@
+import os
+import csv
+import json
+import shutil
+import functools
+import numpy as np
+from pathlib import Path
+
+from sigmoid_media.digest import file_digest
+
+
+# spelled out rather than taken from jobs, which would pull in the scheduler and matplotlib
+DATASETS_PATH = Path(__file__).resolve().parent.parent / '.cache' / 'datasets'
+STAMPS_PATH = DATASETS_PATH / 'stamps.json'
+# bump when the on-disk layout changes so old caches are ignored
+FORMAT_VERSION = 1
+
+
+class Dataset:
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path / 'meta.json').read_text())
+        self.categories = meta['categories']
+        self.columns = {name: np.load(self.path / f'{name}.npy', mmap_mode='r') for name in meta['columns']}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def decode(self, name):
+        return np.asarray(self.categories[name], dtype=object)[self.columns[name]]
+
+    def mask(self, name, value):
+        return self.columns[name] == self.categories[name].index(value)
+
+
+def parse_column(values):
+    for dtype in (np.int64, np.float64):
+        try:
+            return np.array(values, dtype=dtype), None
+        except ValueError:
+            continue
+
+    # anything that is not numeric is stored as categorical codes
+    categories = sorted(set(values))
+    lookup = {category: code for code, category in enumerate(categories)}
+    dtype = np.uint8 if len(categories) <= 256 else np.int32
+
+    return np.array([lookup[value] for value in values], dtype=dtype), categories
+
+
+def build_dataset(source, path):
+    with open(source, newline='') as f:
+        rows = list(csv.reader(f))
+    header, rows = rows[0], rows[1:]
+
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp_path.mkdir(parents=True, exist_ok=True)
+    categories = {}
+    for name, values in zip(header, zip(*rows)):
+        column, column_categories = parse_column(values)
+        np.save(tmp_path / f'{name}.npy', column)
+        if column_categories is not None:
+            categories[name] = column_categories
+    (tmp_path / 'meta.json').write_text(json.dumps({'columns': header, 'categories': categories}, indent=4))
+
+    # another process may have built the same dataset meanwhile, either copy will do
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+@functools.lru_cache(maxsize=None)
+def open_dataset(path):
+    return Dataset(path)
+
+
+def source_digest(source):
+    # the file is only hashed again when its size or modification time changes
+    stat = os.stat(source)
+    key = str(Path(source).resolve())
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    stamps = json.loads(STAMPS_PATH.read_text()) if STAMPS_PATH.exists() else {}
+    if key in stamps and stamps[key]['stamp'] == stamp:
+        return stamps[key]['digest']
+
+    stamps[key] = {'stamp': stamp, 'digest': file_digest(source)}
+    # a concurrent writer may drop this entry, which only costs a hash next time
+    DATASETS_PATH.mkdir(parents=True, exist_ok=True)
+    tmp_path = STAMPS_PATH.with_name(f'{STAMPS_PATH.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(stamps, indent=4, sort_keys=True))
+    os.replace(tmp_path, STAMPS_PATH)
+
+    return stamps[key]['digest']
+
+
+def load_csv(source):
+    # keyed by the file's content, so identical copies share one cache entry and edits rebuild it
+    path = DATASETS_PATH / f'{source_digest(source)}-v{FORMAT_VERSION}'
+    if not (path / 'meta.json').exists():
+        build_dataset(source, path)
+
+    return open_dataset(path)
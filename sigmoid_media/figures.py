@@ -0,0 +1,93 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from pathlib import Path
+
+from sigmoid_media.animation import BACKGROUND, PALETTE_SAMPLE_FRAMES, build_palette
+from sigmoid_media.svg import save_svg
+from sigmoid_media.themes import set_style
+
+
+FIGURE_FORMATS = ('.png', '.svg')
+
+
+class FigureTemplate:
+    def __init__(self, theme, dpi, **kwargs):
+        set_style(theme)
+        self.theme = theme
+        self.dpi = dpi
+        self.fig, self.ax = plt.subplots(**kwargs)
+        self.animated = []
+        self._background = None
+        self.setup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def setup(self):
+        pass
+
+    def update(self, **kwargs):
+        raise NotImplementedError
+
+    def animate(self, *artists):
+        # only these are redrawn per frame, over a background of everything else drawn once
+        for artist in artists:
+            artist.set_animated(True)
+        self.animated.extend(artists)
+
+    def render(self, path, **kwargs):
+        self.update(**kwargs)
+
+        # savefig skips animated artists, so they are drawn like the rest for a still
+        for artist in self.animated:
+            artist.set_animated(False)
+        save_figure(self.fig, path, dpi=self.dpi)
+        for artist in self.animated:
+            artist.set_animated(True)
+
+    def sample_palette(self, frames, background=BACKGROUND, count=PALETTE_SAMPLE_FRAMES):
+        # evenly spaced frames up to the last, so colours that only show up later (error curves, highlights) get entries
+        samples = []
+        for idx in np.unique(np.linspace(0, len(frames) - 1, min(count, len(frames))).round().astype(int)):
+            self.update(**frames[idx])
+            samples.append(self.to_array())
+
+        return build_palette(samples, background=background)
+
+    def to_array(self):
+        if not self.animated:
+            self.fig.set_dpi(self.dpi)
+            return figure_to_array(self.fig)
+
+        if self._background is None:
+            self.fig.set_dpi(self.dpi)
+            self.canvas = FigureCanvasAgg(self.fig)
+            self.canvas.draw()
+            self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+        self.canvas.restore_region(self._background)
+        for artist in sorted(self.animated, key=lambda artist: artist.get_zorder()):
+            self.fig.draw_artist(artist)
+
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+    def close(self):
+        plt.close(self.fig)
+
+
+def figure_to_array(fig):
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+
+def save_figure(fig, path, dpi):
+    if Path(path).suffix == '.svg':
+        save_svg(fig, path)
+    else:
+        fig.savefig(path, dpi=dpi)
@@ -0,0 +1,92 @@
+import sys
+import importlib.util
+from pathlib import Path
+
+from sigmoid_media.scheduler import run_parallel
+
+
+ROOT_PATH = Path(__file__).resolve().parent.parent
+SCRIPT_GLOBS = (
+    'problems/*/main.py',
+    'homepage/*/main.py',
+)
+
+_scripts = {}
+
+
+class Job:
+    def __init__(self, name, fn, outputs, inputs=(), deps=(), kwargs=None, formats=()):
+        self.name = name
+        self.fn = fn
+        self.outputs = [Path(path) for path in outputs]
+        self.inputs = [Path(path) for path in inputs]
+        self.deps = list(deps)
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.formats = tuple(formats)
+
+    def __repr__(self):
+        return f'Job({self.name!r})'
+
+    def as_format(self, suffix):
+        # the same job writing its figures in another format, e.g. '.svg' next to the usual '.png'
+        if suffix not in self.formats:
+            raise ValueError(f'{self.name} cannot write {suffix} files')
+
+        return Job(
+            name=self.name,
+            fn=self.fn,
+            outputs=[path.with_suffix(suffix) for path in self.outputs],
+            inputs=self.inputs,
+            deps=self.deps,
+            kwargs=self.kwargs,
+            formats=self.formats,
+        )
+
+    def run(self):
+        for path in self.outputs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.fn(*self.outputs, **self.kwargs)
+
+
+def discover_scripts(root=ROOT_PATH):
+    return sorted(path for pattern in SCRIPT_GLOBS for path in root.glob(pattern))
+
+
+def script_name(path):
+    return Path(path).resolve().parent.relative_to(ROOT_PATH).as_posix()
+
+
+def load_script(path):
+    path = Path(path).resolve()
+    if path not in _scripts:
+        module_name = 'sigmoid_media.scripts.' + script_name(path).replace('/', '.')
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        _scripts[path] = module
+
+    return _scripts[path]
+
+
+def forget_scripts():
+    # scripts are imported again on next use, so a long-lived process sees their edits
+    _scripts.clear()
+    for name in [name for name in sys.modules if name.startswith('sigmoid_media.scripts.')]:
+        del sys.modules[name]
+
+
+def load_jobs(path):
+    return {job.name: job for job in load_script(path).JOBS}
+
+
+def run_jobs(jobs, workers=1):
+    if workers == 1:
+        for job in jobs:
+            job.run()
+        return
+
+    tasks = {job.name: (job.deps, job.run, ()) for job in jobs}
+    for _ in run_parallel(tasks, workers):
+        pass
@@ -0,0 +1,109 @@
+import io
+import json
+import numpy as np
+from pathlib import Path
+from PIL import Image
+
+from sigmoid_media.digest import file_digest
+from sigmoid_media.jobs import ROOT_PATH
+from sigmoid_media.scheduler import run_parallel
+
+
+MANIFEST_PATH = ROOT_PATH / '.cache' / 'optimized.json'
+WEBP_METHOD = 6
+# served images, including static ones no job renders
+OPTIMIZE_GLOBS = (
+    'problems/**/*.png',
+    'homepage/**/*.png',
+)
+
+
+def palette_image(image):
+    # exact palette of every RGBA colour in the image, or None past the 256 a PNG palette can hold
+    rgba = np.asarray(image.convert('RGBA'))
+    packed = rgba.view(np.uint32).reshape(rgba.shape[:2])
+    colors, indices = np.unique(packed, return_inverse=True)
+    if len(colors) > 256:
+        return None
+
+    entries = colors.view(np.uint8).reshape(-1, 4)
+    paletted = Image.fromarray(indices.reshape(packed.shape).astype(np.uint8), mode='P')
+    paletted.putpalette(entries[:, :3].ravel().tobytes())
+    if (entries[:, 3] < 255).any():
+        paletted.info['transparency'] = entries[:, 3].tobytes()
+
+    return paletted
+
+
+def encode_png(image, **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True, **kwargs)
+
+    return buffer.getvalue()
+
+
+def optimize_png(path):
+    path = Path(path)
+    original = path.read_bytes()
+    image = Image.open(io.BytesIO(original))
+    image.load()
+
+    candidates = {'original': original, 'optimized': encode_png(image)}
+    paletted = palette_image(image)
+    if paletted is not None:
+        candidates['palette'] = encode_png(paletted, **paletted.info)
+
+    # only ever replace the file with something smaller that decodes to the same pixels
+    encoding = min(candidates, key=lambda name: len(candidates[name]))
+    if encoding != 'original':
+        decoded = np.asarray(Image.open(io.BytesIO(candidates[encoding])).convert('RGBA'))
+        if np.array_equal(decoded, np.asarray(image.convert('RGBA'))):
+            path.write_bytes(candidates[encoding])
+        else:
+            encoding = 'original'
+
+    webp_path = path.with_suffix('.webp')
+    image.save(webp_path, format='WEBP', lossless=True, method=WEBP_METHOD)
+
+    return {
+        'original_bytes': len(original),
+        'png_bytes': path.stat().st_size,
+        'webp_bytes': webp_path.stat().st_size,
+        'encoding': encoding,
+        'digest': file_digest(path),
+    }
+
+
+def optimize_tree(manifest, workers, root=ROOT_PATH):
+    # anything not already optimized as it is now, e.g. static images or outputs restored from the render cache
+    tasks = {}
+    for pattern in OPTIMIZE_GLOBS:
+        for path in sorted(root.glob(pattern)):
+            name = path.relative_to(root).as_posix()
+            record = manifest.get(name)
+            if record is not None and record.get('digest') == file_digest(path) and path.with_suffix('.webp').exists():
+                continue
+            tasks[name] = ((), optimize_png, (path,))
+
+    return dict(run_parallel(tasks, workers))
+
+
+def update_manifest(records, path=MANIFEST_PATH):
+    manifest = json.loads(path.read_text()) if path.exists() else {}
+    manifest.update(records)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=4, sort_keys=True))
+
+    return manifest
+
+
+def report_savings(manifest):
+    original = sum(record['original_bytes'] for record in manifest.values())
+    png = sum(record['png_bytes'] for record in manifest.values())
+    webp = sum(record['webp_bytes'] for record in manifest.values())
+    if original:
+        print(
+            f'{len(manifest)} images: {original / 1024:.0f} KB -> png {png / 1024:.0f} KB '
+            f'({100 * (1 - png / original):.0f}% saved), webp {webp / 1024:.0f} KB '
+            f'({100 * (1 - webp / original):.0f}% saved)'
+        )
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+INITIAL_POINTS = 33
+MAX_DEPTH = 40
+TOLERANCE = 2e-4
+
+
+def refine(f, x, y, tolerance, max_depth):
+    # split every interval whose midpoint strays from the chord, all of them at once per pass
+    for _ in range(max_depth):
+        x_mid = (x[:-1] + x[1:]) / 2
+        y_mid = f(x_mid)
+        flagged = np.abs(y_mid - (y[:-1] + y[1:]) / 2) > tolerance
+        if not flagged.any():
+            return x, y, flagged
+
+        idx = np.flatnonzero(flagged) + 1
+        x = np.insert(x, idx, x_mid[flagged])
+        y = np.insert(y, idx, y_mid[flagged])
+
+    x_mid = (x[:-1] + x[1:]) / 2
+    flagged = np.abs(f(x_mid) - (y[:-1] + y[1:]) / 2) > tolerance
+
+    return x, y, flagged
+
+
+def drop_collinear(x, y, keep=None, eps=1e-12):
+    if len(x) < 3:
+        return x, y
+    if keep is None:
+        keep = np.zeros(len(x), dtype=bool)
+
+    # cross product of consecutive segments, zero where the middle vertex adds nothing
+    cross = (x[1:-1] - x[:-2]) * (y[2:] - y[1:-1]) - (y[1:-1] - y[:-2]) * (x[2:] - x[1:-1])
+    scale = np.ptp(x) * max(np.ptp(y), eps)
+    keep = keep | np.concatenate(([True], np.abs(cross) > eps * scale, [True]))
+
+    return x[keep], y[keep]
+
+
+def adaptive_sample(f, xlim, y_span=1, tolerance=TOLERANCE, initial_points=INITIAL_POINTS, max_depth=MAX_DEPTH):
+    x = np.linspace(*xlim, initial_points)
+    x, y, jumps = refine(f, x, np.asarray(f(x), dtype=float), tolerance * y_span, max_depth)
+
+    # intervals that never converged are discontinuities, draw them as an exact vertical jump
+    keep = np.zeros(len(x), dtype=bool)
+    if jumps.any():
+        idx = np.repeat(np.flatnonzero(jumps), 2)
+        x = np.insert(x, idx + 1, (x[idx] + x[idx + 1]) / 2)
+        y = np.insert(y, idx + 1, np.column_stack((y[idx[::2]], y[idx[::2] + 1])).ravel())
+        keep = np.insert(keep, idx + 1, True)
+
+    return drop_collinear(x, y, keep)
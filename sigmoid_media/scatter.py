@@ -0,0 +1,92 @@
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.colors import to_rgba
+from scipy import ndimage
+
+
+RASTER_THRESHOLD = 20000
+RASTER_MIN_SHADE = 0.35
+# just under the markers so later vector overlays (centroids, query points) draw on top
+RASTER_ZORDER_OFFSET = 0.1
+
+
+class DensityImage(Artist):
+    def __init__(self, ax, color, s, alpha, zorder):
+        super().__init__()
+        self.axes = ax
+        self.set_figure(ax.figure)
+        self.set_zorder(zorder)
+        self.color = to_rgba(color)
+        self.s = s
+        self.density_alpha = alpha
+        self.offsets = np.empty((0, 2))
+
+    def rasterize(self, renderer):
+        # binned at draw time, once the limits have settled, one bin per display pixel of the axes,
+        # so every class shares the same grid and the marker footprint is round
+        bbox = self.axes.bbox
+        x0, y0 = int(np.floor(bbox.x0)), int(np.floor(bbox.y0))
+        width, height = int(np.ceil(bbox.x1)) - x0, int(np.ceil(bbox.y1)) - y0
+        radius = max(0, int(round(renderer.points_to_pixels(np.sqrt(self.s)) / 2)))
+
+        # points just outside the axes still reach in by their radius
+        display = self.axes.transData.transform(self.offsets)
+        counts, _, _ = np.histogram2d(
+            display[:, 1],
+            display[:, 0],
+            bins=(height + 2 * radius, width + 2 * radius),
+            range=((y0 - radius, y0 + height + radius), (x0 - radius, x0 + width + radius)),
+        )
+        y, x = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+        counts = ndimage.maximum_filter(counts, footprint=x ** 2 + y ** 2 <= radius ** 2)
+        counts = counts[radius:radius + height, radius:radius + width]
+
+        shade = np.log1p(counts) / np.log1p(max(counts.max(), 1))
+        rgba = np.empty(counts.shape + (4,))
+        rgba[..., :3] = self.color[:3]
+        rgba[..., 3] = np.where(counts > 0, self.density_alpha * (RASTER_MIN_SHADE + (1 - RASTER_MIN_SHADE) * shade), 0)
+
+        # histogram rows already run bottom up, the way draw_image expects them
+        return x0, y0, (rgba * 255).round().astype(np.uint8)
+
+    def draw(self, renderer):
+        if not self.get_visible() or len(self.offsets) == 0:
+            return
+
+        x0, y0, image = self.rasterize(renderer)
+        gc = renderer.new_gc()
+        gc.set_clip_rectangle(self.axes.bbox)
+        renderer.draw_image(gc, x0, y0, image)
+        gc.restore()
+        self.stale = False
+
+
+class DensityScatter:
+    def __init__(self, ax, color, marker, s, alpha=1, label=None):
+        self.ax = ax
+        # an empty scatter carries the legend entry, the points themselves go into one image
+        self.proxy = ax.scatter([], [], color=color, marker=marker, s=s, alpha=alpha, label=label)
+        self.image = ax.add_artist(
+            DensityImage(ax, color, s, alpha, zorder=self.proxy.get_zorder() - RASTER_ZORDER_OFFSET)
+        )
+
+    def set_offsets(self, offsets):
+        offsets = np.asarray(offsets, dtype=float).reshape(-1, 2)
+        self.image.offsets = offsets
+        self.image.stale = True
+
+        if len(offsets) and (self.ax.get_autoscalex_on() or self.ax.get_autoscaley_on()):
+            self.ax.update_datalim(offsets)
+            self.ax.autoscale_view()
+
+
+def scatter(ax, x, y, rasterize=None, **kwargs):
+    if rasterize is None:
+        rasterize = len(x) > RASTER_THRESHOLD
+    if not rasterize:
+        return ax.scatter(x, y, **kwargs)
+
+    density = DensityScatter(ax, **kwargs)
+    density.set_offsets(np.column_stack((x, y)))
+
+    return density
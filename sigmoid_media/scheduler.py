@@ -0,0 +1,39 @@
+import matplotlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from threadpoolctl import threadpool_limits
+
+
+def init_worker():
+    # headless, and one process per core, so keep BLAS/OpenMP from oversubscribing
+    matplotlib.use('Agg')
+    threadpool_limits(limits=1)
+
+
+def run_parallel(tasks, workers):
+    # tasks maps a key to (dependency keys, fn, args); yields (key, result) as tasks finish
+    pending = dict(tasks)
+    done = set()
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        while pending or running:
+            for key, (deps, fn, args) in list(pending.items()):
+                if all(dep in done for dep in deps):
+                    running[executor.submit(fn, *args)] = key
+                    del pending[key]
+
+            if not running:
+                raise RuntimeError(f'Unresolvable dependencies: {list(pending)}')
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    for other in running:
+                        other.cancel()
+                    raise RuntimeError(f'Task {key} failed') from e
+
+                done.add(key)
+                yield key, result
@@ -0,0 +1,65 @@
+import os
+import re
+import matplotlib
+from pathlib import Path
+
+
+# 'none' keeps text as <text>, 'path' stores each glyph once in <defs> and reuses it
+SVG_FONTTYPE = 'none'
+SVG_RC = {
+    'svg.hashsalt': 'sigmoid',
+    'path.simplify': True,
+    'path.simplify_threshold': 0.5,
+}
+SVG_METADATA = {'Date': None}
+SVG_BUDGET = 100 * 1024
+
+STYLE_PATTERN = re.compile(r'<(\w+)((?:(?!\sclass=)[^>])*?) style="([^"]*)"')
+
+
+def merge_styles(svg):
+    # every style string used more than once becomes a single CSS class
+    counts = {}
+    for _, _, style in STYLE_PATTERN.findall(svg):
+        counts[style] = counts.get(style, 0) + 1
+    classes = {style: f's{i}' for i, style in enumerate(style for style, count in counts.items() if count > 1)}
+    if not classes:
+        return svg
+
+    def replace(match):
+        tag, attrs, style = match.groups()
+        if style not in classes:
+            return match.group(0)
+        return f'<{tag}{attrs} class="{classes[style]}"'
+
+    svg = STYLE_PATTERN.sub(replace, svg)
+    rules = ''.join(f'.{name}{{{style}}}' for style, name in classes.items())
+    root_end = svg.index('>', svg.index('<svg')) + 1
+
+    return f'{svg[:root_end]}\n <defs><style type="text/css">{rules}</style></defs>{svg[root_end:]}'
+
+
+def save_svg(fig, path, fonttype=SVG_FONTTYPE):
+    with matplotlib.rc_context({**SVG_RC, 'svg.fonttype': fonttype}):
+        fig.savefig(path, format='svg', metadata=SVG_METADATA)
+
+    path = Path(path)
+    path.write_text(merge_styles(path.read_text()))
+
+
+def report_sizes(paths, budget=SVG_BUDGET):
+    over = []
+    for path in paths:
+        path = Path(path)
+        size = path.stat().st_size
+        line = f'{os.path.relpath(path)}: {size / 1024:.1f} KB'
+
+        raster = path.with_suffix('.png')
+        if raster.exists():
+            line += f' ({100 * size / raster.stat().st_size:.0f}% of png)'
+        if size > budget:
+            line += f' over the {budget / 1024:.0f} KB budget'
+            over.append(path)
+        print(line)
+
+    return over
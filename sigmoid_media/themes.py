@@ -0,0 +1,38 @@
+import seaborn as sns
+from pathlib import Path
+
+
+THEMES = ('light', 'dark')
+SNS_STYLE = {
+    'light': {
+        'grid.color': '#AAB3C8',
+        'axes.facecolor': '#DCDBEE',
+        'figure.facecolor': 'none',
+        'xtick.color': '#000000',
+        'ytick.color': '#000000',
+    },
+    'dark': {
+        'grid.color': '#474072',
+        'axes.facecolor': '#2C2847',
+        'figure.facecolor': 'none',
+        'xtick.color': '#FFFFFF',
+        'ytick.color': '#FFFFFF',
+    },
+}
+BACKGROUND_COLOR = {
+    'light': (255, 255, 255),
+    'dark': (13, 0, 26),
+}
+TEXT_COLOR = {
+    'light': 'black',
+    'dark': 'white',
+}
+
+
+def set_style(theme):
+    sns.set_theme()
+    sns.set_style('darkgrid', SNS_STYLE[theme])
+
+
+def themed_paths(directory, name, suffix='.png'):
+    return [Path(directory) / f'{name}_{theme}{suffix}' for theme in THEMES]
@@ -0,0 +1,79 @@
+import hashlib
+import importlib
+import traceback
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+
+# spelled out rather than taken from jobs, so a client only imports multiprocessing.connection
+ROOT_PATH = Path(__file__).resolve().parent.parent
+WORKER_ADDRESS = str(ROOT_PATH / '.cache' / 'worker.sock')
+WORKER_AUTHKEY = b'sigmoid-media'
+PRELOAD_MODULES = (
+    'matplotlib.pyplot',
+    'seaborn',
+    'sklearn.cluster',
+    'scipy.spatial',
+    'scipy.ndimage',
+    'PIL.Image',
+)
+
+
+def shared_digest():
+    digest = hashlib.sha256()
+    for path in sorted((ROOT_PATH / 'sigmoid_media').glob('*.py')):
+        digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+
+def warm_up():
+    from matplotlib.figure import Figure
+    from sigmoid_media.figures import figure_to_array
+
+    # load fonts and glyph caches before the first real figure
+    fig = Figure()
+    fig.text(0.5, 0.5, 'Warm up 0123456789', weight='bold')
+    fig.add_subplot().plot([0, 1])
+    figure_to_array(fig)
+
+
+def serve(handler, address=WORKER_ADDRESS):
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    warm_up()
+
+    # scripts are re-imported per request, the shared package is not, so edits to it need a restart
+    digest = shared_digest()
+    (ROOT_PATH / '.cache').mkdir(exist_ok=True)
+    Path(address).unlink(missing_ok=True)
+    with Listener(address, family='AF_UNIX', authkey=WORKER_AUTHKEY) as listener:
+        print(f'Render worker listening on {address}', flush=True)
+        while True:
+            with listener.accept() as conn:
+                request = conn.recv()
+                if shared_digest() != digest:
+                    conn.send(('error', 'sigmoid_media changed since the worker started, restart it'))
+                    return
+
+                try:
+                    for line in handler(request):
+                        conn.send(('line', line))
+                except Exception:
+                    conn.send(('error', traceback.format_exc()))
+                else:
+                    conn.send(('done', None))
+
+
+def request(payload, address=WORKER_ADDRESS):
+    # raises FileNotFoundError or ConnectionRefusedError when no worker is running
+    with Client(address, family='AF_UNIX', authkey=WORKER_AUTHKEY) as conn:
+        conn.send(payload)
+        while True:
+            kind, message = conn.recv()
+            if kind == 'line':
+                yield message
+            elif kind == 'error':
+                raise RuntimeError(message)
+            else:
+                return